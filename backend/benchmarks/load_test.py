@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Load test: seed a database, drive the API with concurrent async clients, report latencies.
+
+Seeding tops the target database (DB_URL / --db-url, SQLite or Postgres) up to the requested
+number of load users and policies, so repeated runs start from the same size. Requests are
+issued open-loop at --rps (a slow server does not slow the arrival rate down) by a weighted
+mix of operations; latency is measured from each request's scheduled start, so queueing
+delay is included. --rps 0 runs closed-loop at full speed instead. The report is JSON with
+throughput and p50/p95/p99 per endpoint, meant to be saved per commit and compared. Usage:
+    python -m backend.benchmarks.load_test --base-url http://localhost:8000 --rps 200 --duration 30
+    python -m backend.benchmarks.load_test --in-process --db-url sqlite:///load.db --users 200 --policies 50000
+    python -m backend.benchmarks.load_test --mix list=80,create=20 --output results/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import httpx  # noqa: E402
+from log_stats import percentiles, quantize_ms  # noqa: E402
+
+USER_PREFIX = "loaduser"
+ADMIN = "loadadmin"
+SEED_BATCH = 5000
+LOGIN_RETRIES = 3  # 429s tolerated per login while the server's auth rate limit refills
+SEARCH_WORDS = ("life", "home", "car", "travel", "health", "flood", "fire", "theft")
+DEFAULT_MIX = "list=45,list_admin=10,search=10,create=15,patch=10,delete=5,login=5"
+
+
+def seed(db_url: str, users: int, policies: int, password: str) -> dict:
+    """Create missing load users (one shared hash) and policies; returns the resulting counts."""
+    from sqlalchemy import create_engine, func, insert, select
+    from backend.hashing import pwd_context
+    from db.database import Base
+    from db.migrations import migrate
+    from db.models import PolicyORM, UserORM
+    engine = create_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    migrate(engine)
+    hashed = pwd_context.hash(password)
+    wanted = [(ADMIN, "admin")] + [(f"{USER_PREFIX}{i}", "user") for i in range(users)]
+    with engine.begin() as conn:
+        existing = set(conn.execute(select(UserORM.username).where(UserORM.username.in_([u for u, _ in wanted]))).scalars())
+        missing = [{"username": u, "password": hashed, "role": r} for u, r in wanted if u not in existing]
+        if missing:
+            conn.execute(insert(UserORM), missing)
+        have = conn.execute(select(func.count()).where(PolicyORM.owner.startswith(USER_PREFIX))).scalar_one()
+    for start in range(have, policies, SEED_BATCH):
+        rows = [{"name": f"{random.choice(SEARCH_WORDS).title()} policy {i}",
+                 "details": f"{random.choice(SEARCH_WORDS)} cover, excess {random.randrange(100, 1000)}",
+                 "owner": f"{USER_PREFIX}{i % max(users, 1)}"} for i in range(start, min(start + SEED_BATCH, policies))]
+        with engine.begin() as conn:
+            conn.execute(insert(PolicyORM), rows)
+    engine.dispose()
+    return {"users": users, "policies": max(have, policies)}
+
+
+def policy_ids(db_url: str, limit: int = 20_000) -> list:
+    from sqlalchemy import create_engine, select
+    from db.models import PolicyORM
+    engine = create_engine(db_url)
+    with engine.connect() as conn:
+        ids = list(conn.execute(select(PolicyORM.id).where(PolicyORM.owner.startswith(USER_PREFIX)).limit(limit)).scalars())
+    engine.dispose()
+    return ids
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = defaultdict(Counter)  # endpoint -> {quantized ms: count}
+        self.status = defaultdict(Counter)  # endpoint -> {status: count}
+
+    def add(self, endpoint: str, ms: float, status: int):
+        self.latency[endpoint][quantize_ms(ms)] += 1
+        self.status[endpoint][status] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(self.status):
+            statuses = self.status[endpoint]
+            count = sum(statuses.values())
+            entry = {
+                "requests": count,
+                "throughput_rps": round(count / elapsed, 1),
+                "errors": sum(c for s, c in statuses.items() if s >= 500 or s == 0),
+                "status_codes": {str(s): c for s, c in sorted(statuses.items())},
+            }
+            entry.update(percentiles(self.latency[endpoint], (50, 95, 99)))
+            entry["max_ms"] = max(self.latency[endpoint])
+            endpoints[endpoint] = entry
+        total = sum(e["requests"] for e in endpoints.values())
+        overall = Counter()
+        for hist in self.latency.values():
+            overall.update(hist)
+        return {"requests": total, "throughput_rps": round(total / elapsed, 1),
+                "errors": sum(e["errors"] for e in endpoints.values()),
+                "latency": percentiles(overall, (50, 95, 99)), "endpoints": endpoints}
+
+
+class Workload:
+    """The operations of the mix; each returns (endpoint label, response)."""
+
+    def __init__(self, client: httpx.AsyncClient, tokens: dict, ids: list, password: str):
+        self.client = client
+        self.tokens = tokens
+        self.users = [u for u in tokens if u != ADMIN]
+        self.ids = ids
+        self.password = password
+
+    def _auth(self, username):
+        return {"Authorization": f"Bearer {self.tokens[username]}"}
+
+    async def login(self):
+        data = {"username": random.choice(self.users), "password": self.password}
+        return "POST /login", await self.client.post("/login", data=data)
+
+    async def list(self):
+        return "GET /policies", await self.client.get("/policies", params={"limit": 50}, headers=self._auth(random.choice(self.users)))
+
+    async def list_admin(self):
+        params = {"limit": 100, "cursor": random.choice(self.ids) if self.ids else 0}
+        return "GET /policies (admin)", await self.client.get("/policies", params=params, headers=self._auth(ADMIN))
+
+    async def search(self):
+        params = {"q": random.choice(SEARCH_WORDS), "limit": 20}
+        return "GET /policies/search", await self.client.get("/policies/search", params=params, headers=self._auth(random.choice(self.users)))
+
+    async def create(self):
+        body = {"name": f"{random.choice(SEARCH_WORDS).title()} load", "details": "created by load test"}
+        r = await self.client.post("/policies", json=body, headers=self._auth(random.choice(self.users)))
+        if r.status_code == 200:
+            self.ids.append(r.json()["id"])
+        return "POST /policies", r
+
+    async def patch(self):
+        pid = random.choice(self.ids)
+        return "PATCH /policies/{id}", await self.client.patch(f"/policies/{pid}", json={"details": f"patched {time.time()}"}, headers=self._auth(ADMIN))
+
+    async def delete(self):
+        pid = self.ids.pop(random.randrange(len(self.ids)))
+        return "DELETE /policies/{id}", await self.client.delete(f"/policies/{pid}", headers=self._auth(ADMIN))
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(Workload, name.strip()) or name.startswith("_"):
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def login_all(client: httpx.AsyncClient, usernames, password: str, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(username):
+        for _ in range(LOGIN_RETRIES + 1):
+            async with sem:
+                r = await client.post("/login-json", json={"username": username, "password": password})
+            if r.status_code != 429:
+                r.raise_for_status()
+                return username, r.json()["access_token"]
+            await asyncio.sleep(float(r.headers.get("Retry-After", "1")))
+        raise SystemExit("logins keep getting 429: every load user logs in from this one address, so start the "
+                         "server with RATE_LIMIT_ENABLED=0 (or a larger RATE_LIMIT_AUTH) for load tests")
+    return dict(await asyncio.gather(*(one(u) for u in usernames)))
+
+
+async def run(client: httpx.AsyncClient, workload: Workload, mix: dict, rps: float, duration: float,
+              concurrency: int, recorder: Recorder) -> float:
+    names, weights = list(mix), list(mix.values())
+    sem = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def one(scheduled: float):
+        async with sem:
+            op = random.choices(names, weights)[0]
+            if op in ("patch", "delete") and not workload.ids:
+                op = "create"
+            try:
+                endpoint, r = await getattr(workload, op)()
+                status = r.status_code
+            except httpx.HTTPError:
+                endpoint, status = op, 0
+            recorder.add(endpoint, (loop.time() - scheduled) * 1000, status)
+
+    start = loop.time()
+    if rps > 0:
+        tasks = []
+        for i in range(int(rps * duration)):
+            scheduled = start + i / rps
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(scheduled)))
+        await asyncio.gather(*tasks)
+    else:
+        async def worker():
+            while loop.time() - start < duration:
+                await one(loop.time())
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return loop.time() - start
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main_async(args, db_url: str) -> dict:
+    if args.in_process:
+        from backend.main import app  # imported after DB_URL is set
+        # ASGITransport sends no lifespan events; run startup/shutdown around the run ourselves
+        async with app.router.lifespan_context(app):
+            return await drive(args, db_url, httpx.ASGITransport(app=app), "http://load-test")
+    return await drive(args, db_url, None, args.base_url)
+
+
+async def drive(args, db_url: str, transport, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        usernames = [ADMIN] + [f"{USER_PREFIX}{i}" for i in range(min(args.users, args.login_users))]
+        tokens = await login_all(client, usernames, args.password, args.concurrency)
+        workload = Workload(client, tokens, policy_ids(db_url), args.password)
+        recorder = Recorder()
+        await run(client, workload, parse_mix(args.mix), args.rps, min(args.warmup, args.duration), args.concurrency, Recorder())
+        elapsed = await run(client, workload, parse_mix(args.mix), args.rps, args.duration, args.concurrency, recorder)
+    return recorder.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="serve backend.main in this process (no network)")
+    parser.add_argument("--db-url", default=os.getenv("DB_URL", "sqlite:///load_test.db"), help="database to seed (and serve with --in-process)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--policies", type=int, default=10_000)
+    parser.add_argument("--password", default="loadpass")
+    parser.add_argument("--no-seed", action="store_true", help="use the database as it is")
+    parser.add_argument("--login-users", type=int, default=50, help="distinct users holding tokens during the run")
+    parser.add_argument("--rps", type=float, default=100, help="target requests per second; 0 = as fast as possible")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight list")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+    os.environ["DB_URL"] = args.db_url
+    if args.in_process:
+        os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="load_test_logs_"))  # keep backend/logs clean
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "0")  # every simulated user logs in from one address
+    seeded = None if args.no_seed else seed(args.db_url, args.users, args.policies, args.password)
+    result = asyncio.run(main_async(args, args.db_url))
+    report = {
+        "revision": git_revision(),
+        "target": "in-process" if args.in_process else args.base_url,
+        "database": args.db_url.split("://", 1)[0],
+        "seeded": seeded,
+        "config": {"rps": args.rps, "duration_s": args.duration, "concurrency": args.concurrency, "mix": parse_mix(args.mix)},
+        **result,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
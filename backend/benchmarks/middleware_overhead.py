@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Per-request overhead of the request logging middleware, before and after the rewrite.
+
+Drives a trivial authenticated endpoint in-process (no network) three ways: no logging
+middleware, the previous `log_requests` (buffered body, two records, second JWT decode,
+synchronous file writes) and the current `RequestLogMiddleware`. Usage:
+    python -m backend.benchmarks.middleware_overhead [--requests 3000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from logging.handlers import RotatingFileHandler
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from jose import jwt  # noqa: E402
+from backend.request_logging import JsonFormatter, RequestLogMiddleware, configure_logging  # noqa: E402
+
+SECRET_KEY = "bench"
+ALGORITHM = "HS256"
+TOKEN = jwt.encode({"sub": "alice", "role": "user"}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def legacy_middleware(logger):
+    """The pre-rewrite `log_requests`, kept verbatim in behaviour for comparison."""
+    async def log_requests(request, call_next):
+        request_id = str(uuid.uuid4())
+        start = time.time()
+        rec_start = logging.LogRecord(name=logger.name, level=logging.INFO, pathname=__file__, lineno=0, msg="request.start", args=(), exc_info=None)
+        rec_start.request_id = request_id
+        rec_start.path = request.url.path
+        rec_start.method = request.method
+        rec_start.client_ip = request.client.host if request.client else None
+        rec_start.user_agent = request.headers.get('user-agent')
+        try:
+            body_bytes = await request.body()
+        except Exception:
+            body_bytes = b''
+        rec_start.request_size = len(body_bytes)
+        body_text = body_bytes.decode('utf-8', errors='ignore')
+        rec_start.body_excerpt = (body_text.replace('password', 'pwd') if 'password' in body_text else body_text)[:120]
+        logger.handle(rec_start)
+        response = await call_next(request)
+        level = logging.ERROR if response.status_code >= 400 else logging.INFO
+        rec_end = logging.LogRecord(name=logger.name, level=level, pathname=__file__, lineno=0, msg="request.end", args=(), exc_info=None)
+        rec_end.request_id = request_id
+        rec_end.path = request.url.path
+        rec_end.method = request.method
+        rec_end.status_code = response.status_code
+        status_map = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+                      403: "Forbidden", 404: "Not Found", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+        rec_end.status_text = status_map.get(response.status_code, "")
+        rec_end.duration_ms = int((time.time() - start) * 1000)
+        auth_header = request.headers.get('authorization')
+        if auth_header and auth_header.lower().startswith('bearer '):
+            try:
+                payload = jwt.decode(auth_header.split(' ', 1)[1].strip(), SECRET_KEY, algorithms=[ALGORITHM])
+                rec_end.username = payload.get('sub')
+                rec_end.role = payload.get('role')
+            except Exception:
+                pass
+        rec_end.client_ip = rec_start.client_ip
+        rec_end.user_agent = rec_start.user_agent
+        rec_end.request_size = rec_start.request_size
+        rec_end.body_excerpt = rec_start.body_excerpt
+        logger.handle(rec_end)
+        return response
+    return log_requests
+
+
+def build_app(variant: str, log_dir: str):
+    app = FastAPI()
+
+    @app.post("/policies")
+    async def create(request: Request):
+        request.state.principal = {"username": "alice", "role": "user"}
+        return {"ok": True}
+
+    logger = logging.getLogger(f"bench.{variant}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    log_path = os.path.join(log_dir, f"{variant}.log")
+    if variant == "legacy":
+        handler = RotatingFileHandler(log_path, maxBytes=500_000, backupCount=3)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        app.middleware("http")(legacy_middleware(logger))
+    elif variant == "current":
+        configure_logging(logger, log_path)
+        app.add_middleware(RequestLogMiddleware, logger=logger)
+    return app
+
+
+async def measure(app, n: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    body = {"name": "Life", "details": "x" * 200}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(min(200, n)):  # warm-up
+            await client.post("/policies", json=body, headers=headers)
+        start = time.perf_counter()
+        for _ in range(n):
+            await client.post("/policies", json=body, headers=headers)
+        return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=5, help="interleaved rounds; the best round per variant is reported")
+    args = parser.parse_args()
+    variants = ("none", "legacy", "current")
+    samples = {v: [] for v in variants}
+    with tempfile.TemporaryDirectory() as log_dir:
+        apps = {v: build_app(v, log_dir) for v in variants}
+        for _ in range(args.rounds):
+            for v in variants:
+                samples[v].append(asyncio.run(measure(apps[v], args.requests)))
+    results = {v: min(samples[v]) for v in variants}
+    report = {
+        "requests": args.requests,
+        "rounds": args.rounds,
+        "us_per_request": {k: round(v, 1) for k, v in results.items()},
+        "middleware_overhead_us": {k: round(results[k] - results["none"], 1) for k in ("legacy", "current")},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Cost of turning policy rows into a JSON list body: per-row Pydantic models vs. direct encoding.
+
+Rows are read once from an in-memory SQLite table through `POLICY_COLUMNS`, exactly as the
+list route reads them, then encoded three ways:
+  pydantic - the previous path: an InsurancePolicy per row, then FastAPI's response_model
+             handling (dump, validate, dump to JSON-able data) and JSONResponse's json.dumps
+  stdlib   - `encode_policies` with the stdlib encoder (orjson not installed)
+  orjson   - `encode_policies` with orjson
+Usage:
+    python -m backend.benchmarks.serialization [--rows 10000 100000] [--rounds 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from pydantic import BaseModel, TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+from backend import serialization  # noqa: E402
+from db.database import Base  # noqa: E402
+from db.models import PolicyORM  # noqa: E402
+from db.queries import POLICY_COLUMNS  # noqa: E402
+
+
+class InsurancePolicy(BaseModel):  # same fields as backend.main.InsurancePolicy
+    id: Optional[int]
+    name: str
+    details: str
+    owner: str
+    version: Optional[int] = None
+
+
+ADAPTER = TypeAdapter(List[InsurancePolicy])
+
+
+def load_rows(n: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(PolicyORM), [
+            {"name": f"Policy {i}", "details": "Standard coverage, excess 250 EUR", "owner": f"user{i % 500}"}
+            for i in range(n)
+        ])
+        return conn.execute(select(*POLICY_COLUMNS).order_by(PolicyORM.id)).all()
+
+
+def encode_pydantic(rows) -> bytes:
+    models = [InsurancePolicy(id=r.id, name=r.name, details=r.details or "", owner=r.owner, version=r.version) for r in rows]
+    content = ADAPTER.dump_python(ADAPTER.validate_python([m.model_dump() for m in models]), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def encode_stdlib(rows) -> bytes:
+    saved, serialization.orjson = serialization.orjson, None
+    try:
+        return serialization.encode_policies(rows)
+    finally:
+        serialization.orjson = saved
+
+
+VARIANTS = {"pydantic": encode_pydantic, "stdlib": encode_stdlib, "orjson": serialization.encode_policies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--rounds", type=int, default=5, help="interleaved rounds; the best round per variant is reported")
+    args = parser.parse_args()
+    variants = dict(VARIANTS)
+    if serialization.orjson is None:
+        del variants["orjson"]
+    report = {"orjson_installed": serialization.orjson is not None, "rounds": args.rounds, "results": {}}
+    for n in args.rows:
+        rows = load_rows(n)
+        bodies = {name: fn(rows) for name, fn in variants.items()}
+        assert len({json.dumps(json.loads(b)) for b in bodies.values()}) == 1, "variants disagree"
+        samples = {name: [] for name in variants}
+        for _ in range(args.rounds):
+            for name, fn in variants.items():
+                start = time.perf_counter()
+                fn(rows)
+                samples[name].append(time.perf_counter() - start)
+        best = {name: min(s) for name, s in samples.items()}
+        report["results"][str(n)] = {
+            name: {"ms": round(t * 1000, 1), "rows_per_s": int(n / t), "speedup": round(best["pydantic"] / t, 1)}
+            for name, t in best.items()
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""In-process caches shared by the API (principal lookups, and anything else keyed and short-lived)."""
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after they are stored.
+
+    Bounded by entry count (`maxsize`, None for no limit) and, when `sizeof` is given, by the
+    total of `sizeof(value)` over all entries (`maxbytes`). Hit/miss counters are kept so the
+    cache can be observed in production.
+    """
+
+    def __init__(self, maxsize, ttl: float, clock=time.monotonic, maxbytes: int = None, sizeof=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._sizeof = sizeof
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        size = self._sizeof(value) if self._sizeof is not None else 0
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (expires_at, value, size)
+            self.bytes += size
+            while self._data and ((self.maxsize is not None and len(self._data) > self.maxsize)
+                                  or (self.maxbytes is not None and self.bytes > self.maxbytes)):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize,
+                "bytes": self.bytes, "maxbytes": self.maxbytes}
+
+
+class WriteCounter:
+    """Count of policy writes made through this API, so change-feed long polls can wake as soon
+    as one commits instead of waiting for their next database check."""
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.total += 1
+
+
+class SharedWriteCounter(WriteCounter):
+    """`WriteCounter` in an anonymous shared mapping, so every worker forked after construction
+    (gunicorn: create it in the master) sees writes made by the others."""
+
+    _COUNTER = struct.Struct("Q")
+
+    def __init__(self):
+        self._mem = mmap.mmap(-1, self._COUNTER.size)
+        self._lock = multiprocessing.get_context("fork").Lock()
+
+    @property
+    def total(self):
+        return self._COUNTER.unpack_from(self._mem, 0)[0]
+
+    def bump(self):
+        with self._lock:
+            self._COUNTER.pack_into(self._mem, 0, self.total + 1)
+
+
+# Set by the gunicorn master (backend/gunicorn_conf.py) before it forks workers.
+shared_write_counter = None
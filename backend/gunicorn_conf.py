@@ -0,0 +1,61 @@
+"""Multi-worker production server: gunicorn managing uvicorn workers, one per core by default.
+
+    gunicorn -c backend/gunicorn_conf.py backend.main:app
+
+The master runs schema setup once before forking and tells workers to skip it, gives each
+worker slot its own log file (app-w0.log, app-w1.log, ...; `log_stats.py` reads them all), and
+owns the shared memory behind the change-feed write counter and the rate limiter's buckets. On SIGTERM
+workers stop accepting connections and finish in-flight requests for up to GRACEFUL_TIMEOUT
+seconds.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+worker_class = "uvicorn_worker.UvicornWorker"
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))  # a silent worker is restarted after this
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# Peers whose X-Forwarded-For is trusted for the client IP (rate limits and logs key on it).
+# Behind a load balancer set this to its addresses or subnet, e.g. the VPC CIDR; left at
+# loopback, every client shares the balancer's IP and one login budget.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1,::1")
+# Workers import the app themselves: forking a master that already runs the log listener
+# thread and DB pools is unsafe.
+preload_app = False
+
+# Parallelism already comes from one worker per core, and pbkdf2 runs in hashlib with the GIL
+# released, so by default each worker hashes in its own threadpool instead of a process pool.
+os.environ.setdefault("HASH_WORKERS", "0")
+
+
+def on_starting(server):
+    from backend import caching, rate_limit
+    from db.database import Base, engine
+    from db.migrations import migrate
+    Base.metadata.create_all(bind=engine)
+    applied = migrate(engine)
+    engine.dispose()  # no connections may be inherited by the workers
+    os.environ["DB_SKIP_INIT"] = "1"
+    caching.shared_write_counter = caching.SharedWriteCounter()
+    rate_limit.shared_store = rate_limit.SharedBucketStore()
+    server.log.info("schema ready (migrations applied: %s)", applied or "none")
+
+
+def pre_fork(server, worker):
+    # Runs in the master. A replacement worker reuses the lowest free slot, so the set of log
+    # files stays bounded by `workers` however often workers are recycled.
+    used = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+    worker.slot = next(i for i in range(len(used) + 1) if i not in used)
+
+
+def post_fork(server, worker):
+    os.environ["LOG_WORKER_ID"] = f"w{worker.slot}"
+
+
+def post_worker_init(worker):
+    worker.log.info("worker %s ready (log file app-%s.log)", worker.pid, os.environ["LOG_WORKER_ID"])
+
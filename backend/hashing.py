@@ -0,0 +1,143 @@
+"""Password hashing on a bounded process pool.
+
+pbkdf2_sha256 is deliberately slow; run inline it occupies a request thread (or the event loop)
+for the whole hash. `hash_pool` moves the work to worker processes, caps how many hashes may be
+pending, and sheds load with `HashPoolSaturated` (served as 503) once callers have waited
+`HASH_QUEUE_TIMEOUT` seconds for a slot. passlib is imported, and the context built, on the
+first hash or verify rather than at import.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+
+PBKDF2_ROUNDS = int(os.getenv("PBKDF2_ROUNDS", "29000"))  # passlib's pbkdf2_sha256 default
+# 0 runs hashes in the request threadpool instead of worker processes (tests, tiny deployments)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(max(HASH_WORKERS, 1) * 8)))
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "2"))
+
+
+def make_context(rounds: int = PBKDF2_ROUNDS):
+    from passlib.context import CryptContext
+    # min_rounds makes needs_update()/verify_and_update() flag hashes made with fewer rounds
+    return CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto",
+                        pbkdf2_sha256__default_rounds=rounds, pbkdf2_sha256__min_rounds=rounds)
+
+
+@lru_cache(maxsize=None)
+def get_context():
+    """The process-wide CryptContext (`pwd_context`), built on first use."""
+    return make_context()
+
+
+def __getattr__(name):
+    if name == "pwd_context":
+        return get_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Executed inside the worker processes; must stay importable top-level functions.
+def _hash(password: str) -> str:
+    return get_context().hash(password)
+
+
+def _verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """(matches, replacement hash if `hashed` uses outdated settings such as fewer rounds)."""
+    return get_context().verify_and_update(password, hashed)
+
+
+class HashPoolSaturated(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+class HashPool:
+    def __init__(self, workers: int, max_pending: int, queue_timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _executor_or_create(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: forking a process that already runs threads can deadlock the child
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight < self.max_pending:
+                self.in_flight += 1
+                return True
+            return False
+
+    async def _acquire(self):
+        if self._try_acquire():
+            return
+        deadline = time.monotonic() + self.queue_timeout
+        self.waiting += 1
+        try:
+            while not self._try_acquire():
+                if time.monotonic() >= deadline:
+                    self.rejected += 1
+                    raise HashPoolSaturated()
+                await asyncio.sleep(0.01)
+        finally:
+            self.waiting -= 1
+
+    async def run(self, fn, *args):
+        await self._acquire()
+        start = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._executor_or_create(), fn, *args)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.latency_ms_total += elapsed_ms
+                self.latency_ms_max = max(self.latency_ms_max, elapsed_ms)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self.run(_verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            # hashes accepted but not yet running on a worker
+            "queue_depth": max(self.in_flight - max(self.workers, 1), 0),
+            "waiting_for_slot": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_ms_avg": round(self.latency_ms_total / self.completed, 2) if self.completed else 0.0,
+            "latency_ms_max": round(self.latency_ms_max, 2),
+        }
+
+
+hash_pool = HashPool(HASH_WORKERS, HASH_MAX_PENDING, HASH_QUEUE_TIMEOUT)
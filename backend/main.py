@@ -1,27 +1,75 @@
 # Simple Insurance App Backend
 # FastAPI + SQLite + JWT
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-import datetime
-import os, sys, logging, json, uuid, time
-from logging.handlers import RotatingFileHandler
+from contextlib import asynccontextmanager
+import asyncio, datetime, hashlib, time, uuid
+import os, sys, logging, json, csv, io, tempfile
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  # add project root to path
-from db.database import engine, Base, get_db  # noqa: E402
-from db.models import UserORM, PolicyORM  # noqa: E402
+from db.database import Base, SessionLocal, DBSession, get_engine, get_session  # noqa: E402
+from db import database  # noqa: E402
+from backend import caching  # noqa: E402
+from backend.caching import TTLCache, WriteCounter  # noqa: E402
+from backend.hashing import HashPoolSaturated, get_context, hash_pool  # noqa: E402
+from backend.request_logging import RequestLogMiddleware, configure_logging, remove_logging  # noqa: E402
+from backend import metrics, rate_limit  # noqa: E402
+from backend.serialization import FastJSONResponse, dumps, encode_policies, policy_dicts  # noqa: E402
+from db.models import UserORM, PolicyORM, PolicyChangeORM  # noqa: E402
+from db.queries import (POLICY_COLUMNS, policy_activity_query, policy_by_id_query, policy_changes_floor_query,  # noqa: E402
+                        policy_changes_head_query, policy_changes_query, policy_list_query, policy_list_version_query, policy_owner_stats_query, policy_search_query,
+                        policy_totals_query, search_terms)
 
 # --- Config ---
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Refresh tokens only buy new access tokens (POST /token/refresh), never API access themselves.
+REFRESH_TOKEN_EXPIRE_MINUTES = int(os.getenv("REFRESH_TOKEN_EXPIRE_MINUTES", str(7 * 24 * 60)))
+MAX_PAGE_SIZE = 1000  # upper bound for ?limit= on list endpoints
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))  # rows fetched per round trip when streaming
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))  # rows per INSERT executemany / transaction
+BULK_MAX_ERRORS = 1000  # per-row errors echoed back by /policies/bulk
+BULK_SPOOL_BYTES = 8 * 1024 * 1024  # uploads larger than this spill to a temp file
+BATCH_MAX_OPERATIONS = 1000  # operations accepted by one /policies/batch call
+STATS_MAX_DAYS = 90  # upper bound for ?days= on /policies/stats
+CHANGES_MAX_WAIT = 30  # seconds a /policies/changes long poll may be held open
+CHANGES_POLL_INTERVAL = 0.1  # seconds between checks for new writes while a long poll waits
+CHANGES_RECHECK_INTERVAL = 1.0  # seconds between database checks while a long poll waits (other hosts, late commits)
+CHANGE_LOG_RETENTION_HOURS = float(os.getenv("CHANGE_LOG_RETENTION_HOURS", "168"))  # older changes are pruned
+CHANGE_LOG_PRUNE_INTERVAL = float(os.getenv("CHANGE_LOG_PRUNE_INTERVAL", "3600"))  # seconds; 0 disables pruning
 # DB config now in db/database.py
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds a resolved principal is reused
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Trust `sub`/`role` from our own signed token and skip the users lookup entirely.
+# Role changes then only take effect once the old token expires.
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "0").lower() in ("1", "true", "yes")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))  # verified JWTs whose claims are reused until exp
+LIST_CACHE_BYTES = int(os.getenv("LIST_CACHE_BYTES", str(64 * 1024 * 1024)))  # total of cached GET /policies bodies; 0 disables
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "300"))
+LIST_CACHE_MAX_BYTES = int(os.getenv("LIST_CACHE_MAX_BYTES", str(1024 * 1024)))  # larger bodies are not kept
+# Token buckets per client (IP for auth routes, else username from the bearer token or IP) and route class: "<requests>/<seconds>"
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() in ("1", "true", "yes")
+RATE_LIMITS = {
+    "auth": rate_limit.parse_limit(os.getenv("RATE_LIMIT_AUTH", "10/60")),  # each attempt costs a PBKDF2 hash
+    "bulk": rate_limit.parse_limit(os.getenv("RATE_LIMIT_BULK", "10/60")),
+    "read": rate_limit.parse_limit(os.getenv("RATE_LIMIT_READ", "300/60")),
+    "write": rate_limit.parse_limit(os.getenv("RATE_LIMIT_WRITE", "120/60")),
+}
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))  # buckets kept per process
+# pwd_context (PBKDF2_ROUNDS) and the hashing worker pool live in backend/hashing.py
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(__file__), "logs"))
+# one file per gunicorn worker slot: RotatingFileHandler is not safe across processes
+LOG_WORKER_ID = os.getenv("LOG_WORKER_ID")
 
 # --- Models ---
 class User(BaseModel):
@@ -34,6 +82,7 @@ class InsurancePolicy(BaseModel):
     name: str
     details: str
     owner: str
+    version: Optional[int] = None
 
 class InsurancePolicyCreate(BaseModel):
     name: str
@@ -44,9 +93,51 @@ class InsurancePolicyUpdate(BaseModel):
     details: Optional[str] = None
     owner: Optional[str] = None
 
+class BulkPolicyRow(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    details: Optional[str] = ""
+    owner: Optional[str] = Field(None, max_length=100)
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[dict]
+
+class BatchOperation(BaseModel):
+    op: str = Field(..., pattern="^(patch|delete|reassign)$")
+    id: Optional[int] = None  # patch / delete
+    changes: Optional[InsurancePolicyUpdate] = None  # patch
+    if_match: Optional[int] = None  # patch / delete: expected version, like the If-Match header
+    from_owner: Optional[str] = None  # reassign
+    to_owner: Optional[str] = None  # reassign
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    atomic: bool = False  # roll everything back when any operation fails
+
+class BatchResult(BaseModel):
+    committed: bool
+    results: List[dict]
+
+class PolicyStats(BaseModel):
+    total: int
+    owners: int
+    by_owner: List[dict]  # {"owner", "policies"}, largest first
+    recent_activity: List[dict]  # {"day", "created", "updated", "deleted"}, newest first
+
+class PolicyChanges(BaseModel):
+    changes: List[dict]  # {"seq", "op": "upsert", "id", "policy"} or {"seq", "op": "delete", "id"}
+    next: int  # pass as ?since= on the next call
+    more: bool  # the page was full; call again right away
+
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # seconds the access token is valid
+
+class RefreshBody(BaseModel):
+    refresh_token: str
     
 class LoginBody(BaseModel):
     username: str
@@ -54,140 +145,178 @@ class LoginBody(BaseModel):
 
 # ORM models moved to db/models.py
 
-# --- DB Setup ---
-Base.metadata.create_all(bind=engine)
+# --- Startup ---
+# Importing this module only defines things. Opening the log file, creating the engine and
+# checking the schema happen in the lifespan startup, and the password hashing context is built
+# on first use (backend/hashing.py).
+log_path = os.path.join(LOG_DIR, f"app-{LOG_WORKER_ID}.log" if LOG_WORKER_ID else "app.log")
+logger = logging.getLogger("insurance")
+logger.setLevel(logging.INFO)
+log_listener = None
+startup_seconds = None  # duration of the last startup(), exported as a metric
 
-# --- Auth ---
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+def startup():
+    """Per-process initialisation, run by the lifespan before the first request is served."""
+    global log_listener, startup_seconds
+    started = time.perf_counter()
+    if log_listener is None:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        log_listener = configure_logging(logger, log_path, max_bytes=500_000, backup_count=3)
+    engine = get_engine()
+    metrics.instrument_engine(engine)
+    if database.async_engine is not None:
+        metrics.instrument_engine(database.async_engine.sync_engine)
+    # Under gunicorn the master has already done this once (backend/gunicorn_conf.py).
+    if os.getenv("DB_SKIP_INIT", "0") != "1":
+        from db.migrations import migrate
+        Base.metadata.create_all(bind=engine)
+        migrate(engine)  # indexes/columns added after a database was first created
+    startup_seconds = time.perf_counter() - started
+    logger.info("app.startup finished in %.1f ms", startup_seconds * 1000)
 
-app = FastAPI(title="Insurance API", description="Simple insurance CRUD app", version="1.0.0")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def shutdown():
+    # The server has stopped accepting requests and drained in-flight ones; release what this
+    # process holds so logs are flushed and pool connections closed cleanly.
+    global log_listener
+    hash_pool.shutdown()
+    if log_listener is not None:
+        remove_logging(logger, log_listener)
+        log_listener = None
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+    get_engine().dispose()
 
-# --- Logging ---
-LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(__file__), "logs"))
-os.makedirs(LOG_DIR, exist_ok=True)
-log_path = os.path.join(LOG_DIR, "app.log")
-handler = RotatingFileHandler(log_path, maxBytes=500_000, backupCount=3)
-class JsonFormatter(logging.Formatter):
-    def format(self, record):
-        base = {
-            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
-            "level": record.levelname,
-            "logger": record.name,
-            "msg": record.getMessage(),
-        }
-        if hasattr(record, 'request_id'):
-            base['request_id'] = record.request_id
-        if hasattr(record, 'path'):
-            base['path'] = record.path
-        if hasattr(record, 'method'):
-            base['method'] = record.method
-        if hasattr(record, 'status_code'):
-            base['status_code'] = record.status_code
-        if hasattr(record, 'status_text'):
-            base['status_text'] = record.status_text
-        if hasattr(record, 'duration_ms'):
-            base['duration_ms'] = record.duration_ms
-        if hasattr(record, 'username'):
-            base['username'] = record.username
-        if hasattr(record, 'role'):
-            base['role'] = record.role
-        if hasattr(record, 'client_ip'):
-            base['client_ip'] = record.client_ip
-        if hasattr(record, 'user_agent'):
-            base['user_agent'] = record.user_agent
-        if hasattr(record, 'request_size'):
-            base['request_size'] = record.request_size
-        if hasattr(record, 'body_excerpt'):
-            base['body_excerpt'] = record.body_excerpt
-        return json.dumps(base)
-formatter = JsonFormatter()
-handler.setFormatter(formatter)
-logger = logging.getLogger("insurance")
-logger.setLevel(logging.INFO)
-logger.addHandler(handler)
-
-@app.middleware("http")
-async def log_requests(request, call_next):
-    request_id = str(uuid.uuid4())
-    start = time.time()
-    rec_start = logging.LogRecord(name=logger.name, level=logging.INFO, pathname=__file__, lineno=0, msg="request.start", args=(), exc_info=None)
-    rec_start.request_id = request_id
-    rec_start.path = request.url.path
-    rec_start.method = request.method
-    # metadata
-    rec_start.client_ip = request.client.host if request.client else None
-    rec_start.user_agent = request.headers.get('user-agent')
-    # Attempt body read (non-streaming small bodies)
-    try:
-        body_bytes = await request.body()
-    except Exception:
-        body_bytes = b''
-    rec_start.request_size = len(body_bytes)
-    # mask password fields if present
-    body_text = body_bytes.decode('utf-8', errors='ignore')
-    if 'password' in body_text:
-        body_masked = body_text.replace('password', 'pwd')
-    else:
-        body_masked = body_text
-    rec_start.body_excerpt = body_masked[:120]
-    logger.handle(rec_start)
-    response = await call_next(request)
-    duration_ms = int((time.time() - start) * 1000)
-    level = logging.ERROR if hasattr(response, 'status_code') and response.status_code >= 400 else logging.INFO
-    rec_end = logging.LogRecord(name=logger.name, level=level, pathname=__file__, lineno=0, msg="request.end", args=(), exc_info=None)
-    rec_end.request_id = request_id
-    rec_end.path = request.url.path
-    rec_end.method = request.method
-    rec_end.status_code = response.status_code
-    # Map common codes to phrases; fallback generic
-    status_map = {
-        200: "OK", 201: "Created", 204: "No Content",
-        400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
-        422: "Unprocessable Entity", 500: "Internal Server Error"
-    }
-    rec_end.status_text = status_map.get(response.status_code, "")
-    rec_end.duration_ms = duration_ms
-    # Add user context if token available
-    username = None
-    role = None
-    auth_header = request.headers.get('authorization')
-    if auth_header and auth_header.lower().startswith('bearer '):
-        token = auth_header.split(' ', 1)[1].strip()
+def prune_change_log():
+    """Drop changes older than the retention window. The newest of them stays as a 'pruned'
+    marker: cursors below it may have missed dropped changes and get 410."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=CHANGE_LOG_RETENTION_HOURS)
+    with get_engine().begin() as conn:
+        marker = conn.execute(select(func.max(PolicyChangeORM.seq)).where(PolicyChangeORM.changed_at < cutoff)).scalar()
+        if marker is not None:
+            conn.execute(delete(PolicyChangeORM).where(PolicyChangeORM.seq < marker))
+            conn.execute(update(PolicyChangeORM).where(PolicyChangeORM.seq == marker).values(op="pruned"))
+
+async def prune_change_log_periodically():
+    while True:
+        await asyncio.sleep(CHANGE_LOG_PRUNE_INTERVAL)
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username = payload.get('sub')
-            role = payload.get('role')
-        except Exception:
-            pass
-    rec_end.username = username
-    rec_end.role = role
-    rec_end.client_ip = rec_start.client_ip
-    rec_end.user_agent = rec_start.user_agent
-    rec_end.request_size = rec_start.request_size
-    rec_end.body_excerpt = rec_start.body_excerpt
-    logger.handle(rec_end)
-    return response
+            await run_in_threadpool(prune_change_log)
+        except SQLAlchemyError:
+            logger.exception("change log pruning failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup()
+    pruner = asyncio.create_task(prune_change_log_periodically()) if CHANGE_LOG_PRUNE_INTERVAL > 0 else None
+    yield
+    if pruner is not None:
+        pruner.cancel()
+    await shutdown()
+
+def __getattr__(name):
+    if name == "engine":  # `from backend.main import engine`; created on first use by db.database
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# --- Auth ---
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+router = APIRouter()
 
 def verify_password(plain, hashed):
-    return pwd_context.verify(plain, hashed)
+    return get_context().verify(plain, hashed)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[datetime.timedelta] = None):
     to_encode = data.copy()
     expire = datetime.datetime.utcnow() + (expires_delta or datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
+    to_encode.setdefault("typ", "access")
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# get_db imported from db/database.py
+def create_refresh_token(username: str):
+    # jti keeps refresh tokens issued within the same second distinct
+    return create_access_token({"sub": username, "typ": "refresh", "jti": uuid.uuid4().hex},
+                               datetime.timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES))
+
+def issue_tokens(username: str, role: str) -> dict:
+    return {
+        "access_token": create_access_token(data={"sub": username, "role": role}),
+        "token_type": "bearer",
+        "refresh_token": create_refresh_token(username),
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+# sha256(token) -> verified claims, each entry expiring with its token's `exp`
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def decode_token(token: str, token_type: str = "access") -> dict:
+    """Verified claims of `token`; raises JWTError for a bad signature, expiry or wrong `typ`.
+
+    The signature check runs once per token; later requests with the same token are a hash
+    and a dict lookup. Tokens issued before `typ` existed count as access tokens.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(key, payload, ttl=remaining)
+    if payload.get("typ", "access") != token_type:
+        raise JWTError(f"not an {token_type} token")
+    return payload
+
+# (route class, methods, paths); first match wins, a path also covers its subpaths.
+# Anything unmatched (health, metrics, docs) is never limited.
+RATE_LIMIT_ROUTES = (
+    ("auth", {"POST"}, ("/register", "/login", "/login-json", "/token/refresh")),
+    ("bulk", {"POST"}, ("/policies/bulk", "/policies/batch")),
+    ("read", {"GET"}, ("/policies",)),
+    ("write", {"POST", "PUT", "PATCH", "DELETE"}, ("/policies",)),
+)
+RATE_LIMITED = metrics.REGISTRY.counter("rate_limited_total", "Requests answered 429 by the rate limiter", ("route_class",))
+rate_limit_store = rate_limit.shared_store or rate_limit.MemoryBucketStore(RATE_LIMIT_MAX_CLIENTS)
+
+def rate_limit_class(method: str, path: str) -> Optional[str]:
+    for route_class, methods, paths in RATE_LIMIT_ROUTES:
+        if method in methods and any(path == p or path.startswith(p + "/") for p in paths):
+            return route_class
+    return None
+
+def rate_limit_identity(scope, route_class: Optional[str] = None) -> str:
+    """Username of a valid bearer access token, else the client IP (the log's `client_ip`).
+
+    Login and register are always budgeted per IP: a token would otherwise let one address
+    open a fresh PBKDF2 budget per account it owns. The token is verified through
+    `decode_token`, so get_current_user finds it cached.
+    """
+    for name, value in (scope["headers"] if route_class != "auth" else ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    username = decode_token(token).get("sub")
+                except JWTError:
+                    username = None
+                if username:
+                    return "user:" + username
+            break
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+# get_db / get_session imported from db/database.py
+
+async def run_db(db: DBSession, fn, *args):
+    """Run `fn(session, *args)` without blocking the event loop.
+
+    Routes keep their query logic in plain sync functions; an AsyncSession (DB_ASYNC=1) runs
+    them via `run_sync` on its async driver, a sync Session runs them in the threadpool.
+    """
+    if database.DB_ASYNC:
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
 
 def get_user(username, db: Session):
     row = db.query(UserORM).filter(UserORM.username==username).first()
@@ -195,28 +324,59 @@ def get_user(username, db: Session):
         return {"username": row.username, "password": row.password, "role": row.role}
     return None
 
-def authenticate_user(username, password, db: Session):
-    user = get_user(username, db)
-    if not user or not verify_password(password, user["password"]):
+# username -> {"username", "role"}; never holds the password hash
+principal_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def invalidate_user(username):
+    """Drop a cached principal; call whenever a user row is created, changed or removed."""
+    principal_cache.invalidate(username)
+
+def set_password_hash(username, hashed, db: Session):
+    db.execute(update(UserORM).where(UserORM.username==username).values(password=hashed))
+    db.commit()
+
+async def authenticate_user(username, password, db: DBSession):
+    user = await run_db(db, lambda s: get_user(username, s))
+    if not user:
         return None
+    ok, new_hash = await hash_pool.verify_and_update(password, user["password"])
+    if not ok:
+        return None
+    if new_hash:  # stored hash predates the current PBKDF2_ROUNDS; upgrade it transparently
+        await run_db(db, lambda s: set_password_hash(username, new_hash, s))
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: DBSession = Depends(get_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user(username, db)
+    if AUTH_TRUST_TOKEN_CLAIMS and payload.get("role"):
+        user = {"username": username, "role": payload["role"]}
+    else:
+        user = await load_principal(username, db)
+        if user is None:
+            raise credentials_exception
+    request.state.principal = user  # picked up by RequestLogMiddleware
+    return user
+
+async def load_principal(username: str, db: DBSession):
+    """{"username", "role"} from the principal cache or the users table; None if no such user."""
+    user = principal_cache.get(username)
     if user is None:
-        raise credentials_exception
+        row = await run_db(db, lambda s: get_user(username, s))
+        if row is None:
+            return None
+        user = {"username": row["username"], "role": row["role"]}
+        principal_cache.set(username, user)
     return user
 
 async def get_current_admin(user: dict = Depends(get_current_user)):
@@ -224,89 +384,656 @@ async def get_current_admin(user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+async def hash_pool_saturated_handler(request: Request, exc: HashPoolSaturated):
+    return JSONResponse(status_code=503, content={"detail": "Authentication temporarily overloaded, retry shortly"},
+                        headers={"Retry-After": "1"})
+
 # --- Routes ---
-@app.post("/register", response_model=Token)
-def register(user: User, db: Session = Depends(get_db)):
-    if get_user(user.username, db):
+@router.post("/register", response_model=Token)
+async def register(user: User, db: DBSession = Depends(get_session)):
+    if await run_db(db, lambda s: get_user(user.username, s)):
         raise HTTPException(status_code=400, detail="Username already exists")
-    hashed = get_password_hash(user.password)
-    db.add(UserORM(username=user.username, password=hashed, role=user.role))
-    db.commit()
-    access_token = create_access_token(data={"sub": user.username, "role": user.role})
-    return {"access_token": access_token, "token_type": "bearer"}
+    hashed = await hash_pool.hash(user.password)
+    def add_user(s: Session):
+        s.add(UserORM(username=user.username, password=hashed, role=user.role))
+        s.commit()
+    await run_db(db, add_user)
+    invalidate_user(user.username)
+    return issue_tokens(user.username, user.role)
 
-@app.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(form_data.username, form_data.password, db)
+@router.post("/login", response_model=Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: DBSession = Depends(get_session)):
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    access_token = create_access_token(data={"sub": user["username"], "role": user["role"]})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(user["username"], user["role"])
 
-@app.post("/login-json", response_model=Token)
-def login_json(body: LoginBody, db: Session = Depends(get_db)):
-    user = authenticate_user(body.username, body.password, db)
+@router.post("/login-json", response_model=Token)
+async def login_json(body: LoginBody, db: DBSession = Depends(get_session)):
+    user = await authenticate_user(body.username, body.password, db)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    access_token = create_access_token(data={"sub": user["username"], "role": user["role"]})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return issue_tokens(user["username"], user["role"])
 
-@app.get("/policies", response_model=List[InsurancePolicy])
-def get_policies(user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    q = db.query(PolicyORM)
-    if user["role"] != "admin":
-        q = q.filter(PolicyORM.owner==user["username"])
-    rows = q.all()
-    return [InsurancePolicy(id=r.id, name=r.name, details=r.details or "", owner=r.owner) for r in rows]
-
-@app.post("/policies", response_model=InsurancePolicy)
-def create_policy(policy: InsurancePolicyCreate, user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    row = PolicyORM(name=policy.name, details=policy.details, owner=user["username"])
-    db.add(row)
-    db.commit()
-    db.refresh(row)
-    return InsurancePolicy(id=row.id, name=row.name, details=row.details or "", owner=row.owner)
+@router.post("/token/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshBody, db: DBSession = Depends(get_session)):
+    """Trade a refresh token for a new access/refresh pair without a password check.
 
-@app.put("/policies/{policy_id}", response_model=InsurancePolicy)
-def update_policy(policy_id: int, policy: InsurancePolicy, user: dict = Depends(get_current_admin), db: Session = Depends(get_db)):
-    row = db.query(PolicyORM).filter(PolicyORM.id==policy_id).first()
-    if not row:
-        raise HTTPException(status_code=404, detail="Policy not found")
-    row.name = policy.name
-    row.details = policy.details
-    row.owner = policy.owner
-    db.commit()
-    db.refresh(row)
-    return InsurancePolicy(id=row.id, name=row.name, details=row.details or "", owner=row.owner)
+    The role is re-read rather than copied from the old token, so role changes and deleted
+    users take effect at the next refresh.
+    """
+    try:
+        username = decode_token(body.refresh_token, "refresh").get("sub")
+    except JWTError:
+        username = None
+    user = await load_principal(username, db) if username else None
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return issue_tokens(user["username"], user["role"])
+
+def policy_row_dict(r):
+    return {"id": r.id, "name": r.name, "details": r.details or "", "owner": r.owner, "version": r.version}
+
+POLICY_EXPORT_FIELDS = ("id", "name", "details", "owner")
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
-@app.patch("/policies/{policy_id}", response_model=InsurancePolicy)
-def patch_policy(policy_id: int, patch: InsurancePolicyUpdate, user: dict = Depends(get_current_admin), db: Session = Depends(get_db)):
-    row = db.query(PolicyORM).filter(PolicyORM.id==policy_id).first()
-    if not row:
+def _encode_ndjson(rows):
+    return b"".join(dumps(d) + b"\n" for d in policy_dicts(rows))
+
+def _encode_csv(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows((r.id, r.name, r.details or "", r.owner) for r in rows)
+    return buf.getvalue()
+
+def stream_policies(stmt, fmt: str = "ndjson"):
+    """Yield encoded chunks, one per `STREAM_BATCH_SIZE` rows, from a session owned by the generator.
+
+    The request-scoped session may be closed before the body is sent, so the stream opens its
+    own and fetches with `yield_per` to keep memory flat.
+    """
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    if fmt == "csv":
+        yield ",".join(POLICY_EXPORT_FIELDS) + "\r\n"
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for rows in result.partitions():
+            yield encode(rows)
+    finally:
+        db.close()
+
+async def astream_policies(stmt, fmt: str = "ndjson"):
+    """`stream_policies` for DB_ASYNC=1: a server-side cursor read through the async driver."""
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    if fmt == "csv":
+        yield ",".join(POLICY_EXPORT_FIELDS) + "\r\n"
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield encode(rows)
+
+def policy_stream(stmt, fmt: str):
+    return astream_policies(stmt, fmt) if database.DB_ASYNC else stream_policies(stmt, fmt)
+
+# Serialized list bodies keyed by view + query, each stored with the ETag it was built for.
+list_cache = TTLCache(maxsize=None, ttl=LIST_CACHE_TTL, maxbytes=LIST_CACHE_BYTES, sizeof=lambda entry: len(entry[1]))
+# Routes that write policies call write_counter.bump() after committing, to wake change-feed polls.
+write_counter = caching.shared_write_counter or WriteCounter()
+
+def list_etag(db: Session, owner: Optional[str]) -> str:
+    """Strong ETag for the list visible to `owner` (None: every owner), from the write counters
+    the database keeps per owner, so it is the same on every host and after a restart. Owner
+    tags end with a digest of the owner: two owners at the same count never share a tag."""
+    version = db.execute(policy_list_version_query(owner)).scalar()
+    if owner is None:
+        return f'"{version}"'
+    return f'"{version}.{hashlib.blake2b(owner.encode(), digest_size=8).hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+@router.get("/policies", response_model=List[InsurancePolicy])
+async def get_policies(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for all rows"),
+    cursor: Optional[int] = Query(None, description="Return rows after this id (value of X-Next-Cursor)"),
+    owner: Optional[str] = Query(None, description="Only policies of this owner"),
+    name_prefix: Optional[str] = Query(None, description="Only policies whose name starts with this"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="Sort by id"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams rows as they are read"),
+    if_none_match: Optional[str] = Header(None),
+    user: dict = Depends(get_current_user),
+    db: DBSession = Depends(get_session),
+):
+    """JSON pages carry a strong ETag; a matching If-None-Match answers 304, and an unchanged
+    page is served from `list_cache`. Either costs one primary-key read for the tag."""
+    visible_to = None if user["role"] == "admin" else user["username"]
+    stmt = policy_list_query(get_engine().dialect.name, visible_to, owner, name_prefix, cursor, order)
+    if format == "ndjson":
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return StreamingResponse(policy_stream(stmt, "ndjson"), media_type=STREAM_MEDIA_TYPES["ndjson"])
+    # read before querying: a write landing mid-query then changes the tag and the page is rebuilt
+    etag = await run_db(db, lambda s: list_etag(s, visible_to or owner))
+    # browsers revalidate every poll, and never reuse one user's copy for another token
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    key = (visible_to, owner, name_prefix, cursor, order, limit)
+    cached = list_cache.get(key)
+    if cached is None or cached[0] != etag:
+        body, next_cursor = await _policy_page(db, stmt, limit)
+        cached = (etag, body, next_cursor)
+        if LIST_CACHE_BYTES > 0 and len(body) <= LIST_CACHE_MAX_BYTES:
+            list_cache.set(key, cached)
+    if cached[2] is not None:
+        headers["X-Next-Cursor"] = cached[2]
+    return Response(content=cached[1], media_type="application/json", headers=headers)
+
+async def _policy_page(db: DBSession, stmt, limit: Optional[int]):
+    """(JSON body, next cursor or None) for one page of `stmt`."""
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    rows = await run_db(db, lambda s: s.execute(stmt).all())
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+    return encode_policies(rows), next_cursor
+
+@router.get("/policies/export")
+async def export_policies(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    owner: Optional[str] = Query(None, description="Only policies of this owner"),
+    user: dict = Depends(get_current_user),
+):
+    visible_to = None if user["role"] == "admin" else user["username"]
+    stmt = policy_list_query(get_engine().dialect.name, visible_to, owner)
+    return StreamingResponse(
+        policy_stream(stmt, format),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="policies.{format}"'},
+    )
+
+@router.get("/policies/search", response_model=List[InsurancePolicy])
+async def search_policies(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in name or details"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, ge=0, description="Value of X-Next-Cursor from the previous page"),
+    owner: Optional[str] = Query(None, description="Only policies of this owner"),
+    user: dict = Depends(get_current_user),
+    db: DBSession = Depends(get_session),
+):
+    """Full-text search, best matches first. Every word must match, as a whole word or a prefix."""
+    terms = search_terms(q)
+    if not terms:
+        return []
+    visible_to = None if user["role"] == "admin" else user["username"]
+    offset = cursor or 0  # ranked results have no stable keyset, so the cursor is an offset
+    stmt = policy_search_query(get_engine().dialect.name, terms, visible_to, owner).offset(offset).limit(limit + 1)
+    rows = await run_db(db, lambda s: s.execute(stmt).all())
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(offset + limit)
+    return FastJSONResponse(policy_dicts(rows), headers=headers)
+
+@router.get("/policies/stats", response_model=PolicyStats)
+async def policy_stats(
+    days: int = Query(7, ge=1, le=STATS_MAX_DAYS, description="Days of activity, today (UTC) included"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Owners listed in by_owner"),
+    user: dict = Depends(get_current_user),
+    db: DBSession = Depends(get_session),
+):
+    """Policy totals, counts per owner and daily activity (admin: every owner, user: own).
+
+    Read from summary tables that triggers keep current on every write (migration 4), so the
+    cost follows the number of owners and days, not the number of policies.
+    """
+    visible_to = None if user["role"] == "admin" else user["username"]
+    today = datetime.datetime.utcnow().date()
+    since = today - datetime.timedelta(days=days - 1)
+
+    def read(s: Session):
+        owners, total = s.execute(policy_totals_query(visible_to)).one()
+        by_owner = s.execute(policy_owner_stats_query(visible_to).limit(limit)).all()
+        activity = {day: counts for day, *counts in s.execute(policy_activity_query(since, visible_to))}
+        return owners, total, by_owner, activity
+
+    owners, total, by_owner, activity = await run_db(db, read)
+    recent = []
+    for n in range(days):  # days without writes are listed with zeros
+        day = today - datetime.timedelta(days=n)
+        created, updated, deleted = activity.get(day, (0, 0, 0))
+        recent.append({"day": day.isoformat(), "created": created, "updated": updated, "deleted": deleted})
+    return FastJSONResponse({
+        "total": total,
+        "owners": owners,
+        "by_owner": [{"owner": o, "policies": n} for o, n in by_owner],
+        "recent_activity": recent,
+    })
+
+def read_changes(db: Session, since: Optional[int], limit: int, visible_to: Optional[str]):
+    """One page of the change feed, or None when `since` is outside the retained log."""
+    try:
+        head = db.execute(policy_changes_head_query(get_engine().dialect.name)).scalar_one()
+        if since is None:
+            return {"changes": [], "next": head, "more": False}
+        floor = db.execute(policy_changes_floor_query()).first()
+        if since > head or (floor is not None and floor.op == "pruned" and since < floor.seq):
+            return None
+        # bounded by the head read first: changes still in flight, or committed meanwhile, wait
+        # for the next call
+        rows = db.execute(policy_changes_query(since, head, limit, visible_to)).all()
+    finally:
+        db.rollback()  # hand the connection back between long-poll rounds
+    changes = []
+    for r in rows:
+        if r.id is None or (visible_to is not None and r.owner != visible_to):
+            changes.append({"seq": r.seq, "op": "delete", "id": r.policy_id})  # gone, or no longer visible
+        else:
+            changes.append({"seq": r.seq, "op": "upsert", "id": r.policy_id, "policy": policy_row_dict(r)})
+    more = len(rows) == limit
+    return {"changes": changes, "next": rows[-1].seq if more else head, "more": more}
+
+@router.get("/policies/changes", response_model=PolicyChanges)
+async def policy_changes(
+    since: Optional[int] = Query(None, ge=0, description="`next` from the previous call; omit to get the current position"),
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    wait: float = Query(0, ge=0, le=CHANGES_MAX_WAIT, description="Seconds to hold the request while nothing changed"),
+    user: dict = Depends(get_current_user),
+    db: DBSession = Depends(get_session),
+):
+    """Policies inserted, updated or deleted since `since`, one entry per policy with its
+    current state, oldest change first.
+
+    To sync: call without `since` for a starting position, then fetch /policies, then keep
+    calling with the returned `next`. 410 means the log no longer reaches back that far;
+    start over. With `wait`, an empty answer is held back until a write lands or time runs out.
+    """
+    visible_to = None if user["role"] == "admin" else user["username"]
+    deadline = time.monotonic() + wait
+    while True:
+        seen = write_counter.total  # bumped after every API write, in any worker
+        page = await run_db(db, lambda s: read_changes(s, since, limit, visible_to))
+        if page is None:
+            raise HTTPException(status_code=410, detail="Change log no longer covers this position; re-fetch /policies")
+        if page["changes"] or since is None or time.monotonic() >= deadline:
+            return FastJSONResponse(page)
+        since = page["next"]  # changes up to here were not visible to this caller
+        # local writes wake the poll at once; writes through other hosts, or ones that were still
+        # in flight at the last read, are picked up by the periodic recheck
+        recheck = min(deadline, time.monotonic() + CHANGES_RECHECK_INTERVAL)
+        while write_counter.total == seen and time.monotonic() < recheck:
+            await asyncio.sleep(CHANGES_POLL_INTERVAL)
+
+def iter_bulk_rows(fileobj, fmt: str):
+    """Yield (line_no, row_dict_or_None, error_or_None) from an uploaded NDJSON/CSV file."""
+    # utf-8-sig: spreadsheet exports often start with a byte-order mark, which would end up in
+    # the first header name
+    text_stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            if None in row:  # DictReader keeps fields beyond the header under the key None
+                yield reader.line_num, None, f"{len(row[None])} more field(s) than the header"
+                continue
+            yield reader.line_num, row, None
+        return
+    for line_no, line in enumerate(text_stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, row, None
+
+def _record_error(report: dict, line_no: int, error: str):
+    """Count a failed row; only the first BULK_MAX_ERRORS are kept for the response."""
+    report["failed"] += 1
+    if len(report["errors"]) < BULK_MAX_ERRORS:
+        report["errors"].append({"line": line_no, "error": error})
+
+def _insert_batch(db: Session, batch, report: dict):
+    """Insert one batch in a single executemany + commit; returns rows inserted.
+
+    A rejected batch is replayed row by row so the offending lines can be reported.
+    """
+    try:
+        db.execute(insert(PolicyORM), [values for _, values in batch])
+        db.commit()
+        return len(batch)
+    except SQLAlchemyError:
+        db.rollback()
+    inserted = 0
+    for line_no, values in batch:
+        try:
+            db.execute(insert(PolicyORM), [values])
+            db.commit()
+            inserted += 1
+        except SQLAlchemyError as e:
+            db.rollback()
+            _record_error(report, line_no, str(e.orig if getattr(e, "orig", None) else e))
+    return inserted
+
+def import_policies(fileobj, fmt: str, default_owner: str):
+    with SessionLocal() as db:
+        return _import_policies(fileobj, fmt, default_owner, db)
+
+def _import_policies(fileobj, fmt: str, default_owner: str, db: Session):
+    inserted = 0
+    report = {"failed": 0, "errors": []}
+    batch = []
+    for line_no, row, error in iter_bulk_rows(fileobj, fmt):
+        if error is None:
+            try:
+                parsed = BulkPolicyRow(**row)
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+        if error is not None:
+            _record_error(report, line_no, error)
+            continue
+        batch.append((line_no, {"name": parsed.name, "details": parsed.details or "", "owner": parsed.owner or default_owner}))
+        if len(batch) >= BULK_BATCH_SIZE:
+            inserted += _insert_batch(db, batch, report)
+            batch = []
+    if batch:
+        inserted += _insert_batch(db, batch, report)
+    return {"inserted": inserted, **report}
+
+@router.post("/policies/bulk", response_model=BulkImportResult)
+async def bulk_import_policies(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Defaults from Content-Type"),
+    user: dict = Depends(get_current_admin),
+):
+    """Import policies from NDJSON or CSV (columns: name, details, owner; owner defaults to the caller).
+
+    The body is streamed into a spooled temp file, then inserted in batches of `BULK_BATCH_SIZE`,
+    each in its own transaction. Invalid rows are skipped and reported by line number.
+    Parsing is CPU work, so the import always runs in the threadpool on a sync session.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    with tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            return await run_in_threadpool(import_policies, spool, format, user["username"])
+        finally:
+            write_counter.bump()  # batches commit as they go
+
+def policy_etag(version: int) -> str:
+    return f'"{version}"'
+
+def parse_if_match(value: Optional[str]):
+    """Versions accepted by an If-Match header; None when absent or `*` (no version check).
+
+    Weak tags (W/"...") never satisfy If-Match, so they are dropped.
+    """
+    if value is None or value.strip() == "*":
+        return None
+    versions = []
+    for tag in value.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+def write_policy(db: Session, stmt, policy_id: int, expected_versions):
+    """Run a single UPDATE/DELETE ... RETURNING for one policy, commit, and return the row.
+
+    No row back means the policy is missing (404) or, when If-Match was given, that it has
+    moved on to another version (412); only that failure path costs a second query.
+    """
+    if expected_versions is not None:
+        stmt = stmt.where(PolicyORM.version.in_(expected_versions))
+    row = db.execute(stmt, execution_options={"synchronize_session": False}).first()
+    if row is None:
+        db.rollback()
+        if expected_versions is not None and db.execute(select(PolicyORM.id).where(PolicyORM.id==policy_id)).first():
+            raise HTTPException(status_code=412, detail="Policy was modified; re-fetch and retry")
         raise HTTPException(status_code=404, detail="Policy not found")
-    if patch.name is not None:
-        row.name = patch.name
-    if patch.details is not None:
-        row.details = patch.details
-    if patch.owner is not None:
-        row.owner = patch.owner
     db.commit()
-    db.refresh(row)
-    return InsurancePolicy(id=row.id, name=row.name, details=row.details or "", owner=row.owner)
+    return row
 
-@app.delete("/policies/{policy_id}")
-def delete_policy(policy_id: int, user: dict = Depends(get_current_admin), db: Session = Depends(get_db)):
-    row = db.query(PolicyORM).filter(PolicyORM.id==policy_id).first()
-    if not row:
+def read_policy(db: Session, policy_id: int, expected_versions):
+    """The current row of one policy, with the same 404/412 answers as `write_policy`."""
+    row = db.execute(policy_by_id_query(policy_id)).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Policy not found")
-    db.delete(row)
-    db.commit()
+    if expected_versions is not None and row.version not in expected_versions:
+        raise HTTPException(status_code=412, detail="Policy was modified; re-fetch and retry")
+    return row
+
+@router.post("/policies", response_model=InsurancePolicy)
+async def create_policy(policy: InsurancePolicyCreate, user: dict = Depends(get_current_user), db: DBSession = Depends(get_session)):
+    def create(db: Session):
+        row = db.execute(
+            insert(PolicyORM).values(name=policy.name, details=policy.details, owner=user["username"]).returning(*POLICY_COLUMNS)
+        ).first()
+        db.commit()
+        return row
+    row = await run_db(db, create)
+    write_counter.bump()
+    return FastJSONResponse(policy_row_dict(row), headers={"ETag": policy_etag(row.version)})
+
+@router.put("/policies/{policy_id}", response_model=InsurancePolicy)
+async def update_policy(policy_id: int, policy: InsurancePolicy,
+                        if_match: Optional[str] = Header(None), user: dict = Depends(get_current_admin),
+                        db: DBSession = Depends(get_session)):
+    stmt = (update(PolicyORM).where(PolicyORM.id==policy_id)
+            .values(name=policy.name, details=policy.details, owner=policy.owner, version=PolicyORM.version + 1)
+            .returning(*POLICY_COLUMNS))
+    row = await run_db(db, lambda s: write_policy(s, stmt, policy_id, parse_if_match(if_match)))
+    write_counter.bump()
+    return FastJSONResponse(policy_row_dict(row), headers={"ETag": policy_etag(row.version)})
+
+@router.patch("/policies/{policy_id}", response_model=InsurancePolicy)
+async def patch_policy(policy_id: int, patch: InsurancePolicyUpdate,
+                       if_match: Optional[str] = Header(None), user: dict = Depends(get_current_admin),
+                       db: DBSession = Depends(get_session)):
+    values = {k: v for k, v in (("name", patch.name), ("details", patch.details), ("owner", patch.owner)) if v is not None}
+    if not values:
+        # an empty patch answers with the current row; no UPDATE runs, so no row trigger fires
+        row = await run_db(db, lambda s: read_policy(s, policy_id, parse_if_match(if_match)))
+        return FastJSONResponse(policy_row_dict(row), headers={"ETag": policy_etag(row.version)})
+    stmt = (update(PolicyORM).where(PolicyORM.id==policy_id)
+            .values(**values, version=PolicyORM.version + 1).returning(*POLICY_COLUMNS))
+    row = await run_db(db, lambda s: write_policy(s, stmt, policy_id, parse_if_match(if_match)))
+    write_counter.bump()
+    return FastJSONResponse(policy_row_dict(row), headers={"ETag": policy_etag(row.version)})
+
+@router.delete("/policies/{policy_id}")
+async def delete_policy(policy_id: int, if_match: Optional[str] = Header(None), user: dict = Depends(get_current_admin),
+                        db: DBSession = Depends(get_session)):
+    stmt = delete(PolicyORM).where(PolicyORM.id==policy_id).returning(PolicyORM.id, PolicyORM.owner)
+    await run_db(db, lambda s: write_policy(s, stmt, policy_id, parse_if_match(if_match)))
+    write_counter.bump()
     return {"detail": "Deleted"}
 
-@app.get("/debug/error500")
+def _batch_op_error(op: BatchOperation):
+    if op.op == "reassign":
+        if not op.from_owner or not op.to_owner:
+            return "reassign needs from_owner and to_owner"
+        return None
+    if op.id is None:
+        return f"{op.op} needs an id"
+    if op.op == "patch" and (op.changes is None or not op.changes.model_dump(exclude_none=True)):
+        return "patch needs at least one change"
+    return None
+
+def _by_id_filter(ops):
+    """WHERE clause matching each op's policy id, plus its version when the op carries if_match."""
+    unconditional = [op.id for op in ops if op.if_match is None]
+    conditional = [(op.id, op.if_match) for op in ops if op.if_match is not None]
+    clauses = []
+    if unconditional:
+        clauses.append(PolicyORM.id.in_(unconditional))
+    if conditional:
+        clauses.append(tuple_(PolicyORM.id, PolicyORM.version).in_(conditional))
+    return or_(*clauses)
+
+def apply_batch(db: Session, operations: List[BatchOperation], atomic: bool = False):
+    """Apply patch/delete/reassign operations in one transaction with a handful of statements.
+
+    Deletes run as one `DELETE ... WHERE id IN (...)`, patches as one UPDATE per distinct set
+    of changes, and each reassign as one `UPDATE ... WHERE owner = ?`. By-id operations run
+    before reassigns, and a policy may be targeted by only one by-id operation per batch.
+    Results come back in request order with an HTTP-style status per operation.
+    """
+    results = [{"index": i, "op": op.op} for i, op in enumerate(operations)]
+    targeted = {}  # policy id -> index of the by-id operation
+    for i, op in enumerate(operations):
+        error = _batch_op_error(op)
+        if error is None and op.op != "reassign":
+            if op.id in targeted:
+                error = f"policy {op.id} is already targeted by operation {targeted[op.id]}"
+            else:
+                targeted[op.id] = i
+        if error is not None:
+            results[i].update(status=422, error=error)
+    deletes = [operations[i] for i in targeted.values() if operations[i].op == "delete"]
+    patches = {}  # changes -> ops sharing them
+    for i in targeted.values():
+        op = operations[i]
+        if op.op == "patch":
+            patches.setdefault(tuple(sorted(op.changes.model_dump(exclude_none=True).items())), []).append(op)
+
+    applied = {}  # policy id -> returned row
+    if deletes:
+        stmt = delete(PolicyORM).where(_by_id_filter(deletes)).returning(PolicyORM.id, PolicyORM.owner)
+        applied.update((r.id, r) for r in db.execute(stmt, execution_options={"synchronize_session": False}))
+    for changes, ops in patches.items():
+        stmt = (update(PolicyORM).where(_by_id_filter(ops))
+                .values(**dict(changes), version=PolicyORM.version + 1).returning(*POLICY_COLUMNS))
+        applied.update((r.id, r) for r in db.execute(stmt, execution_options={"synchronize_session": False}))
+    missed = [pid for pid in targeted if pid not in applied]
+    existing = set(db.execute(select(PolicyORM.id).where(PolicyORM.id.in_(missed))).scalars()) if missed else set()
+    for pid, i in targeted.items():
+        row = applied.get(pid)
+        if row is not None:
+            results[i].update(status=200, id=pid)
+            if operations[i].op == "patch":
+                results[i]["policy"] = policy_row_dict(row)
+        elif pid in existing:  # present but at another version than if_match
+            results[i].update(status=412, id=pid, error="Policy was modified; re-fetch and retry")
+        else:
+            results[i].update(status=404, id=pid, error="Policy not found")
+    for i, op in enumerate(operations):
+        if op.op == "reassign" and "status" not in results[i]:
+            stmt = (update(PolicyORM).where(PolicyORM.owner==op.from_owner)
+                    .values(owner=op.to_owner, version=PolicyORM.version + 1))
+            updated = db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+            results[i].update(status=200, updated=updated)
+
+    if atomic and any(r["status"] != 200 for r in results):
+        db.rollback()
+        for r in results:
+            if r["status"] == 200:
+                r.update(status=424, error="Not applied: another operation in the atomic batch failed")
+                r.pop("policy", None)
+                r.pop("updated", None)
+        return {"committed": False, "results": results}
+    db.commit()
+    return {"committed": True, "results": results}
+
+@router.post("/policies/batch", response_model=BatchResult)
+async def batch_policies(batch: BatchRequest, user: dict = Depends(get_current_admin), db: DBSession = Depends(get_session)):
+    """Patch, delete or reassign many policies in a single request and transaction."""
+    result = await run_db(db, lambda s: apply_batch(s, batch.operations, batch.atomic))
+    if result["committed"]:
+        write_counter.bump()
+    return result
+
+@metrics.REGISTRY.register_collector
+def _app_metrics():
+    cache = principal_cache.stats()
+    lists = list_cache.stats()
+    tokens = token_cache.stats()
+    pool = hash_pool.stats()
+    dropped = sum(getattr(h, "dropped", 0) for h in logger.handlers)
+    return [
+        ("principal_cache_hits_total", "counter", "Principal cache hits", {(): cache["hits"]}),
+        ("principal_cache_misses_total", "counter", "Principal cache misses", {(): cache["misses"]}),
+        ("principal_cache_entries", "gauge", "Cached principals", {(): cache["size"]}),
+        ("token_cache_hits_total", "counter", "Requests whose JWT was already verified", {(): tokens["hits"]}),
+        ("token_cache_misses_total", "counter", "JWT signature verifications", {(): tokens["misses"]}),
+        ("list_cache_hits_total", "counter", "Policy list lookups in the response cache that found an entry", {(): lists["hits"]}),
+        ("list_cache_misses_total", "counter", "Policy list lookups in the response cache that found none", {(): lists["misses"]}),
+        ("list_cache_entries", "gauge", "Serialized policy lists cached", {(): lists["size"]}),
+        ("list_cache_bytes", "gauge", "Total size of the cached policy lists", {(): lists["bytes"]}),
+        ("password_hash_in_flight", "gauge", "Password hashes admitted to the pool", {(): pool["in_flight"]}),
+        ("password_hash_queue_depth", "gauge", "Password hashes waiting for a worker", {(): pool["queue_depth"]}),
+        ("password_hash_waiting_for_slot", "gauge", "Callers waiting for a hashing slot", {(): pool["waiting_for_slot"]}),
+        ("password_hash_completed_total", "counter", "Password hashes completed", {(): pool["completed"]}),
+        ("password_hash_rejected_total", "counter", "Password hashes rejected with 503", {(): pool["rejected"]}),
+        ("password_hash_latency_ms_avg", "gauge", "Mean password hash latency", {(): pool["latency_ms_avg"]}),
+        ("log_records_dropped_total", "counter", "Request log records dropped by a full queue", {(): dropped}),
+        ("app_startup_seconds", "gauge", "Duration of the last lifespan startup", {(): round(startup_seconds or 0, 4)}),
+    ]
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@router.get("/debug/cache-stats")
+def cache_stats(user: dict = Depends(get_current_admin)):
+    return {"principal_cache": principal_cache.stats(), "token_cache": token_cache.stats(), "list_cache": list_cache.stats()}
+
+@router.get("/debug/hash-stats")
+def hash_stats(user: dict = Depends(get_current_admin)):
+    return hash_pool.stats()
+
+@router.get("/debug/error500")
 def trigger_error():
     """Debug endpoint to test 500 error handling and logging"""
     raise Exception("Intentional server error for testing")
 
+@router.get("/health", include_in_schema=False)
+async def health():
+    """Liveness: answers once startup has finished, without touching the database."""
+    return {"status": "ok"}
+
+# --- App ---
+def create_app() -> FastAPI:
+    app = FastAPI(title="Insurance API", description="Simple insurance CRUD app", version="1.0.0",
+                  default_response_class=FastJSONResponse, lifespan=lifespan)
+    if RATE_LIMIT_ENABLED:  # innermost, so 429s still get CORS headers, a log record and metrics
+        app.add_middleware(rate_limit.RateLimitMiddleware, store=rate_limit_store, limits=RATE_LIMITS,
+                           classify=rate_limit_class, identify=rate_limit_identity, on_reject=RATE_LIMITED.inc)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag"],
+    )
+    app.add_middleware(
+        RequestLogMiddleware,
+        logger=logger,
+        sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "1.0")),  # share of successful requests logged
+        capture_body=os.getenv("LOG_REQUEST_BODY", "0").lower() in ("1", "true", "yes"),
+        body_max_bytes=int(os.getenv("LOG_BODY_MAX_BYTES", "120")),
+    )
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_exception_handler(HashPoolSaturated, hash_pool_saturated_handler)
+    app.include_router(router)  # binds the routes to this app, so app.dependency_overrides applies
+    return app
+
+app = create_app()
+
 # --- API Docs ---
 # FastAPI provides Swagger UI at /docs and OpenAPI at /openapi.json
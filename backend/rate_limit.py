@@ -0,0 +1,147 @@
+"""Token-bucket rate limiting per client and route class.
+
+Every (route class, client) pair owns a bucket of `burst` tokens refilled at `rate` tokens per
+second; a request takes one token or is answered 429 with Retry-After. Clients are identified
+by the caller (backend/main.py: the client IP for login/register, otherwise the username of a
+valid bearer token, else the client IP), and
+buckets live in a store: `MemoryBucketStore` per process, or `SharedBucketStore` in memory
+shared by every gunicorn worker forked after it was created.
+"""
+import hashlib
+import math
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+Limit = namedtuple("Limit", "rate burst")  # tokens per second, bucket size
+
+
+def parse_limit(spec: str) -> Limit:
+    """"20/60" -> 20 requests per 60 seconds, in bursts of up to 20."""
+    requests, _, seconds = spec.partition("/")
+    requests, seconds = int(requests), float(seconds or 1)
+    if requests < 1 or seconds <= 0:
+        raise ValueError(f"invalid rate limit {spec!r}; expected <requests>/<seconds>")
+    return Limit(requests / seconds, requests)
+
+
+def _take(tokens: float, updated: float, now: float, limit: Limit):
+    """(tokens left, seconds to wait) after trying to take one token from a bucket last touched
+    at `updated`; the wait is 0 when the request may proceed."""
+    tokens = min(float(limit.burst), tokens + (now - updated) * limit.rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / limit.rate
+
+
+class MemoryBucketStore:
+    """Buckets in a bounded LRU dict. An evicted client starts again with a full bucket."""
+
+    def __init__(self, maxsize: int = 100_000, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit) -> float:
+        """Seconds until `key` may retry; 0 when the request is allowed."""
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.burst, now))
+            tokens, wait = _take(tokens, updated, now, limit)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SharedBucketStore:
+    """Buckets in an anonymous shared mapping, so every worker forked after construction
+    (gunicorn: create it in the master) draws from the same budget.
+
+    Keys are hashed onto sets of `WAYS` slots, each holding the key's fingerprint. A key missing
+    from a full set evicts the bucket that would hold the most tokens by now and inherits that
+    balance rather than a full bucket, so cycling colliding keys (usernames are chosen by
+    clients) never buys extra requests. Only a client colliding with busy buckets can be
+    throttled early, which needs more than `WAYS` active keys in one set.
+    """
+
+    _SLOT = struct.Struct("Qdd")  # fingerprint (0 = empty), tokens, updated (CLOCK_MONOTONIC is system-wide)
+    WAYS = 2
+
+    def __init__(self, slots: int = 65536, clock=time.monotonic):
+        self.sets = max(1, slots // self.WAYS)
+        self._clock = clock
+        self._mem = mmap.mmap(-1, self._SLOT.size * self.WAYS * self.sets)
+        self._lock = multiprocessing.get_context("fork").Lock()
+
+    def take(self, key: str, limit: Limit) -> float:
+        fingerprint = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big") | 1
+        base = self._SLOT.size * self.WAYS * (fingerprint % self.sets)
+        now = self._clock()
+        with self._lock:
+            ways = [(offset, *self._SLOT.unpack_from(self._mem, offset))
+                    for offset in range(base, base + self._SLOT.size * self.WAYS, self._SLOT.size)]
+            hit = [way for way in ways if way[1] == fingerprint]
+            if hit:
+                offset, _, tokens, updated = hit[0]
+            else:
+                def balance(way):
+                    _, owner, tokens, updated = way
+                    return limit.burst if owner == 0 else min(limit.burst, tokens + (now - updated) * limit.rate)
+                offset, owner, tokens, updated = max(ways, key=balance)
+                if owner == 0:
+                    tokens, updated = limit.burst, now
+            tokens, wait = _take(tokens, updated, now, limit)
+            self._SLOT.pack_into(self._mem, offset, fingerprint, tokens, now)
+        return wait
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying `limits[route class]` to each request.
+
+    `classify(method, path)` names the route class, or None for requests that are never
+    limited; `identify(scope, route_class)` names the client; `on_reject(route_class)` is called for every
+    request answered 429.
+    """
+
+    def __init__(self, app, store, limits: dict, classify, identify, on_reject=None):
+        self.app = app
+        self.store = store
+        self.limits = limits
+        self.classify = classify
+        self.identify = identify
+        self.on_reject = on_reject
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = self.classify(scope["method"], scope["path"])
+        limit = self.limits.get(route_class)
+        if limit is not None:
+            wait = self.store.take(f"{route_class}:{self.identify(scope, route_class)}", limit)
+            if wait > 0:
+                if self.on_reject is not None:
+                    self.on_reject(route_class)
+                await self._reject(send, wait)
+                return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(send, wait: float):
+        body = b'{"detail":"Too many requests, retry later"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"retry-after", str(max(1, math.ceil(wait))).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# Set by the gunicorn master (backend/gunicorn_conf.py) before it forks workers.
+shared_store = None
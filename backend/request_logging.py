@@ -0,0 +1,154 @@
+"""Request logging: one JSON record per request, written off the event loop.
+
+`RequestLogMiddleware` is a plain ASGI middleware, so it never buffers or consumes the request
+body; body capture (opt-in) copies at most `body_max_bytes` as the app reads the stream. The
+principal is read from `request.state.principal`, set by `get_current_user`, instead of
+decoding the JWT again. Records go through a bounded queue to a `QueueListener` thread that
+owns the `RotatingFileHandler`.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import time
+import uuid
+from http import HTTPStatus
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+STATUS_TEXT = {s.value: s.phrase for s in HTTPStatus}
+LOG_FIELDS = ("request_id", "path", "method", "status_code", "status_text", "duration_ms", "username", "role",
+              "client_ip", "user_agent", "request_size", "body_excerpt")
+# value may be cut off by the excerpt limit, so no closing quote is required
+_PASSWORD_RE = re.compile(r'("password"\s*:\s*")[^"]*|(password=)[^&\s]*')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        base = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                base[field] = value
+        if record.exc_info:
+            base["exc"] = self.formatException(record.exc_info)
+        return json.dumps(base)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler over a bounded queue: when the writer falls behind, drop and count records
+    rather than grow memory or block the event loop."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(logger: logging.Logger, log_path: str, max_bytes: int = 500_000, backup_count: int = 3,
+                      queue_size: int = 10_000) -> QueueListener:
+    """Attach a queue-backed JSON file writer to `logger`; returns the started listener."""
+    file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(JsonFormatter())
+    q = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(q, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    logger.addHandler(DroppingQueueHandler(q))
+    return listener
+
+
+def stop_listener(listener: QueueListener):
+    """Write out queued records and stop the writer thread; safe to call more than once."""
+    if listener._thread is not None:
+        listener.stop()
+
+
+def remove_logging(logger: logging.Logger, listener: QueueListener):
+    """Undo `configure_logging`: flush and stop the writer, then detach its queue handler."""
+    stop_listener(listener)
+    for handler in [h for h in logger.handlers if isinstance(h, QueueHandler) and h.queue is listener.queue]:
+        logger.removeHandler(handler)
+
+
+def mask_passwords(text: str) -> str:
+    return _PASSWORD_RE.sub(lambda m: (m.group(1) or m.group(2)) + "***", text)
+
+
+class RequestLogMiddleware:
+    def __init__(self, app, logger: logging.Logger, sample_rate: float = 1.0, capture_body: bool = False,
+                 body_max_bytes: int = 120):
+        self.app = app
+        self.logger = logger
+        self.sample_rate = sample_rate  # fraction of successful (< 400) requests logged; errors always are
+        self.capture_body = capture_body
+        self.body_max_bytes = body_max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state["request_id"] = str(uuid.uuid4())
+        status_code = 500
+        received = 0
+        body = bytearray() if self.capture_body else None
+
+        async def receive_wrapper():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                received += len(chunk)
+                if body is not None and len(body) < self.body_max_bytes:
+                    body.extend(chunk[:self.body_max_bytes - len(body)])
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            level = logging.ERROR if status_code >= 400 else logging.INFO
+            if (level == logging.ERROR or self.sample_rate >= 1.0 or random.random() < self.sample_rate) \
+                    and self.logger.isEnabledFor(level):
+                self._emit(scope, state, level, status_code, start, received, body)
+
+    def _emit(self, scope, state, level, status_code, start, received, body):
+        record = logging.LogRecord(self.logger.name, level, __file__, 0, "request.end", (), None)
+        record.request_id = state["request_id"]
+        record.path = scope["path"]
+        record.method = scope["method"]
+        record.status_code = status_code
+        record.status_text = STATUS_TEXT.get(status_code, "")
+        record.duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        principal = state.get("principal")
+        if principal:
+            record.username = principal.get("username")
+            record.role = principal.get("role")
+        client = scope.get("client")
+        record.client_ip = client[0] if client else None
+        headers = dict(scope["headers"])
+        user_agent = headers.get(b"user-agent")
+        record.user_agent = user_agent.decode("latin-1") if user_agent else None
+        content_length = headers.get(b"content-length")
+        record.request_size = int(content_length) if content_length and content_length.isdigit() else received
+        if body is not None:
+            record.body_excerpt = mask_passwords(body.decode("utf-8", errors="ignore"))
+        self.logger.handle(record)
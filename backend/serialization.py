@@ -0,0 +1,34 @@
+"""JSON encoding for policy responses without per-row Pydantic models.
+
+Routes select plain column tuples (`POLICY_COLUMNS`) and encode them straight to bytes, and
+return the response themselves so FastAPI does not validate them again against
+`response_model` (which stays on the route for the OpenAPI schema). orjson is used when
+installed; otherwise the stdlib encoder produces the same compact JSON.
+"""
+import json
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def policy_dicts(rows) -> list:
+    """Rows of `POLICY_COLUMNS` (id, name, details, owner, version) as response dicts."""
+    return [{"id": i, "name": n, "details": d or "", "owner": o, "version": v} for i, n, d, o, v in rows]
+
+
+def encode_policies(rows) -> bytes:
+    return dumps(policy_dicts(rows))
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
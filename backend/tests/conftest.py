@@ -1,5 +1,11 @@
 import logging
+import os
 import re
+import sys
+import pytest
+
+# Test modules share one client IP and log in far more often than any real client would.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
 
 _records = []
 
@@ -11,6 +17,18 @@ class RequestEndFilter(logging.Filter):
 
 logging.getLogger('insurance').addFilter(RequestEndFilter())
 
+@pytest.fixture(scope="session", autouse=True)
+def app_lifespan():
+    """Run backend.main's lifespan (log file, engine, schema check) around the session, as a
+    server would; the module-level TestClients in the test files do not enter it themselves."""
+    main = sys.modules.get("backend.main")
+    if main is None:  # only modules that never import the app were collected
+        yield
+        return
+    from fastapi.testclient import TestClient
+    with TestClient(main.app):
+        yield
+
 # Pytest hook to print summary
 
 def pytest_sessionfinish(session, exitstatus):
@@ -0,0 +1,148 @@
+import os, sys
+TEST_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "caching.db")
+if os.path.exists(TEST_DB_PATH):
+    os.remove(TEST_DB_PATH)
+os.environ["DB_URL"] = "sqlite:///" + TEST_DB_PATH
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from fastapi.testclient import TestClient
+from backend.caching import TTLCache
+from backend.main import app, list_cache, principal_cache, token_cache
+from backend import main
+from backend import metrics
+client = TestClient(app)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiry_and_lru_eviction():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_authenticated_requests_reuse_cached_principal():
+    t = client.post("/register", json={"username": "cacheadmin", "password": "pass", "role": "admin"}).json()["access_token"]
+    h = {"Authorization": f"Bearer {t}"}
+    client.get("/policies", headers=h, params={"limit": 1})
+    hits = principal_cache.hits
+    client.get("/policies", headers=h, params={"limit": 1})
+    assert principal_cache.hits == hits + 1
+    stats = client.get("/debug/cache-stats", headers=h).json()["principal_cache"]
+    assert stats["hits"] >= 1 and stats["size"] >= 1
+
+
+def token_headers(username, role="user"):
+    t = client.post("/register", json={"username": username, "password": "pass", "role": role}).json()["access_token"]
+    return {"Authorization": f"Bearer {t}"}
+
+
+def test_policy_list_etag_and_cached_body():
+    h = token_headers("etaguser")
+    client.post("/policies", headers=h, json={"name": "Cached", "details": "d"})
+    first = client.get("/policies", headers=h)
+    etag = first.headers["ETag"]
+    assert [p["name"] for p in first.json()] == ["Cached"]
+    assert client.get("/policies", headers={**h, "If-None-Match": etag}).status_code == 304
+    queries = metrics.DB_QUERIES.value("SELECT")
+    again = client.get("/policies", headers=h)
+    assert again.content == first.content and again.headers["ETag"] == etag
+    assert metrics.DB_QUERIES.value("SELECT") == queries + 1  # the tag read; the body came from list_cache
+    client.post("/policies", headers=h, json={"name": "Second", "details": "d"})
+    changed = client.get("/policies", headers={**h, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert [p["name"] for p in changed.json()] == ["Cached", "Second"]
+    assert list_cache.stats()["size"] >= 1
+
+
+def test_owner_change_invalidates_previous_owner_list():
+    admin = token_headers("etagadmin2", role="admin")
+    h = token_headers("etagloser")
+    pid = client.post("/policies", headers=h, json={"name": "Moving", "details": "d"}).json()["id"]
+    etag = client.get("/policies", headers=h).headers["ETag"]
+    client.patch(f"/policies/{pid}", headers=admin, json={"owner": "etagwinner"})
+    r = client.get("/policies", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 200 and r.json() == []
+
+
+def test_list_etag_is_never_shared_between_users():
+    alice, bob = token_headers("etagalice"), token_headers("etagbob")
+    client.post("/policies", headers=alice, json={"name": "Alice's", "details": "d"})
+    client.post("/policies", headers=bob, json={"name": "Bob's", "details": "d"})  # equal counters
+    first = client.get("/policies", headers=alice)
+    assert "Authorization" in first.headers["Vary"]
+    r = client.get("/policies", headers={**bob, "If-None-Match": first.headers["ETag"]})
+    assert r.status_code == 200 and [p["name"] for p in r.json()] == ["Bob's"]
+
+
+def test_list_etag_sees_writes_made_outside_the_api():
+    # another host, or raw SQL: nothing in this process is told about the write
+    h = token_headers("etagoutside")
+    client.post("/policies", headers=h, json={"name": "Before", "details": "d"})
+    first = client.get("/policies", headers=h)
+    with main.get_engine().begin() as conn:
+        conn.exec_driver_sql("INSERT INTO policies (name, details, owner, version) VALUES ('Elsewhere', 'd', 'etagoutside', 1)")
+    r = client.get("/policies", headers={**h, "If-None-Match": first.headers["ETag"]})
+    assert r.status_code == 200 and [p["name"] for p in r.json()] == ["Before", "Elsewhere"]
+    admin = token_headers("etagoutsideadmin", role="admin")
+    tag = client.get("/policies", headers=admin).headers["ETag"]
+    with main.get_engine().begin() as conn:
+        conn.exec_driver_sql("UPDATE policies SET details = 'changed' WHERE name = 'Elsewhere'")
+    assert client.get("/policies", headers={**admin, "If-None-Match": tag}).status_code == 200
+
+
+def test_ttl_cache_bounded_by_total_bytes():
+    cache = TTLCache(maxsize=None, ttl=10, maxbytes=10, sizeof=len)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    cache.set("c", b"1234")  # 12 bytes: the least recently used entry goes
+    assert cache.get("a") is None and cache.get("c") == b"1234"
+    assert cache.stats()["bytes"] == 8
+    cache.set("c", b"1")  # replacing an entry releases its old size
+    assert cache.stats()["bytes"] == 5
+
+
+def test_shared_write_counter_visible_across_fork():
+    import multiprocessing
+    from backend.caching import SharedWriteCounter
+    counter = SharedWriteCounter()
+    child = multiprocessing.get_context("fork").Process(target=counter.bump)
+    child.start()
+    child.join()
+    assert counter.total == 1
+
+
+def test_verified_token_is_decoded_once(monkeypatch):
+    h = token_headers("tokencacheuser")
+    calls = []
+    real_decode = main.jwt.decode
+    monkeypatch.setattr(main.jwt, "decode", lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+    for _ in range(3):
+        assert client.get("/policies", headers=h, params={"limit": 1}).status_code == 200
+    assert len(calls) == 1
+    assert token_cache.stats()["hits"] >= 2
+
+
+def test_refresh_token_flow():
+    tokens = client.post("/register", json={"username": "refresher", "password": "pass", "role": "user"}).json()
+    assert tokens["expires_in"] > 0 and tokens["refresh_token"]
+    # a refresh token is not an access token, and vice versa
+    assert client.get("/policies", headers={"Authorization": f"Bearer {tokens['refresh_token']}"}).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": tokens["access_token"]}).status_code == 401
+    renewed = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert renewed.status_code == 200
+    assert client.get("/policies", headers={"Authorization": f"Bearer {renewed.json()['access_token']}"}).status_code == 200
+    assert client.post("/token/refresh", json={"refresh_token": "garbage"}).status_code == 401
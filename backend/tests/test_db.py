@@ -0,0 +1,64 @@
+import os, sys
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from sqlalchemy import create_engine, inspect, text
+from db import database
+from db.database import Base, async_url, engine_kwargs
+from db.migrations import migrate, explain_hot_queries
+
+
+def make_legacy_db(tmp_path):
+    """A database created before the policy indexes existed."""
+    eng = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE users (username VARCHAR(100) PRIMARY KEY, password VARCHAR(256) NOT NULL, role VARCHAR(20) NOT NULL)"))
+        conn.execute(text("CREATE TABLE policies (id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, details TEXT, owner VARCHAR(100) NOT NULL)"))
+        conn.execute(text("INSERT INTO policies (name, details, owner) VALUES ('Life', 'x', 'alice')"))
+    return eng
+
+
+def test_migrate_adds_indexes_to_existing_db(tmp_path):
+    eng = make_legacy_db(tmp_path)
+    Base.metadata.create_all(bind=eng)  # what app startup does; leaves the old table untouched
+    assert migrate(eng) == [1, 2, 3, 4, 5, 6, 7]
+    names = {ix["name"] for ix in inspect(eng).get_indexes("policies")}
+    assert {"ix_policies_owner_id", "ix_policies_name"} <= names
+    assert "version" in {c["name"] for c in inspect(eng).get_columns("policies")}
+    with eng.connect() as conn:
+        assert conn.execute(text("SELECT version FROM policies")).scalar_one() == 1
+        # rows that existed before the search index are indexed too
+        assert conn.execute(text("SELECT rowid FROM policies_fts WHERE policies_fts MATCH 'life'")).scalar_one() == 1
+        # existing policies are counted, and later writes keep the counts current
+        conn.execute(text("INSERT INTO policies (name, details, owner) VALUES ('Home', 'y', 'alice')"))
+        conn.execute(text("UPDATE policies SET owner = 'bob' WHERE name = 'Life'"))
+        assert dict(conn.execute(text("SELECT owner, policies FROM policy_owner_stats")).all()) == {"alice": 1, "bob": 1}
+        # list versions count every write per owner, including both sides of a move
+        assert dict(conn.execute(text("SELECT owner, version FROM policy_list_versions")).all()) == {"alice": 2, "bob": 1}
+    assert migrate(eng) == []  # idempotent
+
+
+def test_hot_query_plans_use_indexes(tmp_path):
+    eng = make_legacy_db(tmp_path)
+    migrate(eng)
+    plans = explain_hot_queries(eng)
+    assert any("ix_policies_owner_id" in line for line in plans["list_own_policies"])
+    assert any("ix_policies_name" in line for line in plans["list_by_name_prefix"])
+    assert not any(line.startswith("SCAN") for line in plans["get_policy_by_id"])
+    assert not any(line.startswith("SCAN") for line in plans["policy_list_version"])
+    assert any("VIRTUAL TABLE INDEX" in line for line in plans["search_policies"])
+
+
+def test_async_url_maps_drivers():
+    assert async_url("sqlite:////tmp/app.db") == "sqlite+aiosqlite:////tmp/app.db"
+    assert (async_url("postgresql+psycopg2://app:s3cret@db:5432/insurance")
+            == "postgresql+asyncpg://app:s3cret@db:5432/insurance")  # password kept for the driver
+
+
+def test_engine_kwargs_pool_settings(monkeypatch):
+    assert engine_kwargs("sqlite:///app.db") == {"connect_args": {"check_same_thread": False}}
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 20)
+    monkeypatch.setattr(database, "DB_POOL_PRE_PING", False)
+    kwargs = engine_kwargs("postgresql://app@db/insurance")
+    assert kwargs["pool_size"] == 20 and kwargs["pool_pre_ping"] is False
+    assert {"max_overflow", "pool_timeout", "pool_recycle"} <= set(kwargs)
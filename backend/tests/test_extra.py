@@ -1,4 +1,4 @@
-import os, sys
+import os, json, subprocess, sys
 TEST_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "extra.db")
 if os.path.exists(TEST_DB_PATH):
     os.remove(TEST_DB_PATH)
@@ -60,3 +60,48 @@ def test_internal_server_error():
     r = client.get("/debug/error500")
     # FastAPI converts unhandled exceptions to 500
     assert r.status_code == 500
+
+
+def test_import_has_no_side_effects(tmp_path):
+    # nothing touches the database, the log directory or passlib until the lifespan starts
+    env = dict(os.environ, DB_URL=f"sqlite:///{tmp_path / 'cold.db'}", LOG_DIR=str(tmp_path / "logs"))
+    code = "import sys, backend.main; print(sorted(m for m in ('passlib', 'db.migrations') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+    assert not os.listdir(tmp_path)
+    assert client.get("/health").json() == {"status": "ok"}
+
+
+ASYNC_SMOKE = """
+import json
+from fastapi.testclient import TestClient
+from backend.main import app
+from db import database
+with TestClient(app) as c:
+    c.post("/register", json={"username": "asyncadmin", "password": "pass", "role": "admin"})
+    t = c.post("/login-json", json={"username": "asyncadmin", "password": "pass"}).json()["access_token"]
+    h = {"Authorization": "Bearer " + t}
+    created = c.post("/policies", headers=h, json={"name": "Async", "details": "d"}).json()
+    listed = c.get("/policies", headers=h).json()
+    streamed = [json.loads(line) for line in c.get("/policies", headers=h, params={"format": "ndjson"}).text.splitlines()]
+    missing = c.patch("/policies/999999", headers=h, json={"name": "x"}).status_code
+    print(json.dumps([database.DB_ASYNC, created["name"], [p["id"] for p in listed], [p["id"] for p in streamed], missing]))
+"""
+
+
+def test_async_session_path(tmp_path):
+    # the suite's own client runs on whatever DB_ASYNC says; this always exercises AsyncSession
+    env = dict(os.environ, DB_ASYNC="1", DB_URL=f"sqlite:///{tmp_path / 'async.db'}", LOG_DIR=str(tmp_path / "logs"),
+               HASH_WORKERS="0", RATE_LIMIT_ENABLED="0")
+    out = subprocess.run([sys.executable, "-c", ASYNC_SMOKE], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == [True, "Async", [1], [1], 404]
+
+
+def test_dependency_overrides_apply():
+    from backend.main import get_current_user
+    app.dependency_overrides[get_current_user] = lambda: {"username": "override", "role": "admin"}
+    try:
+        assert client.get("/debug/cache-stats").status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+    assert client.get("/debug/cache-stats").status_code == 401
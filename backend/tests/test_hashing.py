@@ -0,0 +1,43 @@
+import os, sys, asyncio, time
+TEST_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "hashing.db")
+if os.path.exists(TEST_DB_PATH):
+    os.remove(TEST_DB_PATH)
+os.environ["DB_URL"] = "sqlite:///" + TEST_DB_PATH
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import pytest
+from fastapi.testclient import TestClient
+from backend.hashing import HashPool, HashPoolSaturated, make_context, pwd_context
+from backend.main import app, SessionLocal, UserORM
+client = TestClient(app)
+
+
+def test_login_rehashes_outdated_hash():
+    client.post("/register", json={"username": "rehash", "password": "pass", "role": "user"})
+    weak = make_context(rounds=1000).hash("pass")
+    with SessionLocal() as db:
+        db.get(UserORM, "rehash").password = weak
+        db.commit()
+    r = client.post("/login-json", json={"username": "rehash", "password": "pass"})
+    assert r.status_code == 200
+    with SessionLocal() as db:
+        stored = db.get(UserORM, "rehash").password
+    assert stored != weak
+    assert not pwd_context.needs_update(stored)
+    assert client.post("/login-json", json={"username": "rehash", "password": "pass"}).status_code == 200
+
+
+def test_pool_rejects_when_saturated():
+    pool = HashPool(workers=0, max_pending=1, queue_timeout=0.05)
+
+    async def scenario():
+        slow = asyncio.ensure_future(pool.run(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HashPoolSaturated):
+            await pool.run(time.sleep, 0)
+        await slow
+
+    asyncio.run(scenario())
+    stats = pool.stats()
+    assert stats["rejected"] == 1 and stats["completed"] == 1 and stats["in_flight"] == 0
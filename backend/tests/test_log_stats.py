@@ -0,0 +1,49 @@
+import os, sys, json
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import log_stats
+
+
+def end_record(path, status, ms, user="alice", ip="10.0.0.1", method="GET"):
+    return json.dumps({"msg": "request.end", "path": path, "method": method, "status_code": status,
+                       "duration_ms": ms, "username": user, "client_ip": ip}) + "\n"
+
+
+def write_logs(tmp_path):
+    with open(tmp_path / "app.log", "w") as f:
+        for ms in range(1, 101):
+            f.write(end_record("/policies", 200, ms))
+        f.write(json.dumps({"msg": "request.start", "path": "/policies", "method": "GET"}) + "\n")
+        f.write("garbage line\n")
+    with open(tmp_path / "app.log.1", "w") as f:
+        f.write("2025-11-19 19:32:24,062 INFO insurance START DELETE /policies/7\n")
+        f.write("2025-11-19 19:32:24,066 INFO insurance END DELETE /policies/7 status=404\n")
+        f.write(end_record("/policies/9", 500, 3.5, user="bob", ip="10.0.0.2", method="DELETE"))
+    (tmp_path / "unrelated.txt").write_text(end_record("/x", 200, 1))
+
+
+def test_aggregates_json_legacy_and_rotations(tmp_path):
+    write_logs(tmp_path)
+    report = log_stats.analyze([str(tmp_path)]).report()
+    assert report["total_requests"] == 102
+    p = report["paths"]["GET /policies"]
+    assert (p["p50_ms"], p["p95_ms"], p["p99_ms"]) == (50, 95, 99)
+    d = report["paths"]["DELETE /policies/{id}"]
+    assert d["requests"] == 2 and d["error_rate_4xx"] == 0.5 and d["error_rate_5xx"] == 0.5
+    assert report["status_codes"] == {"200": 100, "404": 1, "500": 1}
+    assert report["top_users"][0] == ("alice", 100)
+    assert report["legacy_lines"] == 1 and report["skipped_lines"] == 1
+
+
+def test_parallel_byte_ranges_match_single_pass(tmp_path):
+    write_logs(tmp_path)
+    files = log_stats.discover([str(tmp_path)])
+    single = log_stats.analyze([str(tmp_path)]).report()
+    ranges = log_stats.split_ranges(files, 1000)  # many ranges, most splitting lines
+    assert len(ranges) > 5
+    merged = log_stats.LogStats()
+    for r in ranges:
+        merged.merge(log_stats.scan_range(*r))
+    assert merged.report() == single
+    assert log_stats.analyze([str(tmp_path)], jobs=2).report() == single
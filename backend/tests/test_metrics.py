@@ -0,0 +1,42 @@
+import os, sys
+TEST_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "metrics.db")
+if os.path.exists(TEST_DB_PATH):
+    os.remove(TEST_DB_PATH)
+os.environ["DB_URL"] = "sqlite:///" + TEST_DB_PATH
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from fastapi.testclient import TestClient
+from backend import metrics
+from backend.main import app
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5):
+        h.observe(v, "/x")
+    lines = h.render()
+    assert 't_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{route="/x",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{route="/x",le="+Inf"} 3' in lines
+    assert 't_seconds_count{route="/x"} 3' in lines
+
+
+def test_metrics_endpoint_reports_routes_and_db():
+    t = client.post("/register", json={"username": "metricsuser", "password": "pass", "role": "user"}).json()["access_token"]
+    pid = client.post("/policies", headers={"Authorization": f"Bearer {t}"}, json={"name": "M", "details": "d"}).json()["id"]
+    client.get(f"/policies/{pid}")  # 405: still labelled by template, never by raw id
+    before = metrics.DB_QUERIES.value("SELECT")
+    client.get("/policies", headers={"Authorization": f"Bearer {t}"})
+    assert metrics.DB_QUERIES.value("SELECT") > before
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert 'http_requests_total{method="POST",route="/policies",status="200"}' in body
+    assert f"/policies/{pid}" not in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/policies",le="+Inf"}' in body
+    assert "db_query_duration_seconds_count" in body
+    assert "db_pool_checkout_wait_seconds_count" in body
+    assert "principal_cache_hits_total" in body
@@ -0,0 +1,275 @@
+import os, sys, json
+TEST_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "policies.db")
+if os.path.exists(TEST_DB_PATH):
+    os.remove(TEST_DB_PATH)
+os.environ["DB_URL"] = "sqlite:///" + TEST_DB_PATH
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from fastapi.testclient import TestClient
+from backend.main import app, Base, engine
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+def register(username, password="pass", role="user"):
+    return client.post("/register", json={"username": username, "password": password, "role": role})
+
+def auth(username, password="pass"):
+    t = client.post("/login-json", json={"username": username, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {t}"}
+
+def create(headers, name, details="d"):
+    return client.post("/policies", headers=headers, json={"name": name, "details": details}).json()
+
+
+def test_keyset_pagination_and_filters():
+    register("pageuser")
+    h = auth("pageuser")
+    ids = [create(h, f"Pager {i}")["id"] for i in range(5)]
+    create(h, "Other")
+    first = client.get("/policies", headers=h, params={"limit": 2, "name_prefix": "Pager"})
+    assert first.status_code == 200
+    assert [p["id"] for p in first.json()] == ids[:2]
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get("/policies", headers=h, params={"limit": 2, "name_prefix": "Pager", "cursor": cursor})
+    assert [p["id"] for p in second.json()] == ids[2:4]
+    last = client.get("/policies", headers=h, params={"limit": 2, "name_prefix": "Pager", "cursor": second.headers["X-Next-Cursor"]})
+    assert [p["id"] for p in last.json()] == ids[4:]
+    assert "X-Next-Cursor" not in last.headers
+    desc = client.get("/policies", headers=h, params={"name_prefix": "Pager", "order": "desc"})
+    assert [p["id"] for p in desc.json()] == ids[::-1]
+
+
+def test_owner_filter_cannot_widen_user_scope():
+    register("ownerA")
+    register("ownerB")
+    create(auth("ownerA"), "A policy")
+    r = client.get("/policies", headers=auth("ownerB"), params={"owner": "ownerA"})
+    assert r.status_code == 200
+    assert r.json() == []
+
+
+def test_ndjson_stream():
+    register("streamadmin", role="admin")
+    h = auth("streamadmin")
+    pid = create(h, "Streamed")["id"]
+    r = client.get("/policies", headers=h, params={"format": "ndjson", "owner": "streamadmin"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["id"] for row in rows] == [pid]
+    assert rows[0]["owner"] == "streamadmin"
+
+
+def test_bulk_import_ndjson_reports_row_errors():
+    register("bulkadmin", role="admin")
+    h = auth("bulkadmin")
+    body = "\n".join([
+        json.dumps({"name": "Bulk A", "details": "a", "owner": "bulkowner"}),
+        "{not json",
+        json.dumps({"details": "missing name"}),
+        json.dumps({"name": "Bulk B"}),
+    ])
+    r = client.post("/policies/bulk", headers={**h, "Content-Type": "application/x-ndjson"}, content=body)
+    assert r.status_code == 200
+    result = r.json()
+    assert result["inserted"] == 2
+    assert [e["line"] for e in result["errors"]] == [2, 3]
+    owners = {p["name"]: p["owner"] for p in client.get("/policies", headers=h, params={"name_prefix": "Bulk "}).json()}
+    assert owners == {"Bulk A": "bulkowner", "Bulk B": "bulkadmin"}
+
+
+def test_bulk_import_csv_and_export_roundtrip():
+    register("csvadmin", role="admin")
+    h = auth("csvadmin")
+    body = 'name,details,owner\nCSV One,"multi\nline",csvowner\nCSV Two,plain,csvowner\n'
+    r = client.post("/policies/bulk", headers={**h, "Content-Type": "text/csv"}, content=body)
+    assert r.json() == {"inserted": 2, "failed": 0, "errors": []}
+    exported = client.get("/policies/export", headers=h, params={"format": "csv", "owner": "csvowner"})
+    assert exported.status_code == 200
+    assert exported.headers["content-type"].startswith("text/csv")
+    lines = exported.text.splitlines()
+    assert lines[0] == "id,name,details,owner"
+    assert "multi" in exported.text and "CSV Two" in exported.text
+
+
+def test_bulk_import_csv_bom_extra_fields_and_error_cap(monkeypatch):
+    from backend import main
+    monkeypatch.setattr(main, "BULK_MAX_ERRORS", 2)
+    register("csvbomadmin", role="admin")
+    h = auth("csvbomadmin")
+    body = "\ufeffname,details,owner\nBOM One,b,csvbom\nA,b,c,EXTRA\n,x,y\n,x,y\n".encode("utf-8")
+    r = client.post("/policies/bulk", headers={**h, "Content-Type": "text/csv"}, content=body)
+    assert r.status_code == 200
+    result = r.json()
+    assert (result["inserted"], result["failed"]) == (1, 3)
+    assert result["errors"][0]["line"] == 3 and "more field" in result["errors"][0]["error"]
+    assert len(result["errors"]) == 2
+
+
+def test_bulk_import_requires_admin():
+    register("bulkuser")
+    r = client.post("/policies/bulk", headers=auth("bulkuser"), content=json.dumps({"name": "x"}))
+    assert r.status_code == 403
+
+
+def test_if_match_optimistic_concurrency():
+    register("etagadmin", role="admin")
+    h = auth("etagadmin")
+    created = client.post("/policies", headers=h, json={"name": "Etag", "details": "v1"})
+    pid, etag = created.json()["id"], created.headers["ETag"]
+    assert created.json()["version"] == 1 and etag == '"1"'
+    first = client.patch(f"/policies/{pid}", headers={**h, "If-Match": etag}, json={"details": "v2"})
+    assert first.status_code == 200 and first.headers["ETag"] == '"2"'
+    # a second editor still holding the old ETag must not overwrite the change
+    stale = client.put(f"/policies/{pid}", headers={**h, "If-Match": etag},
+                       json={"id": pid, "name": "Etag", "details": "lost", "owner": "etagadmin"})
+    assert stale.status_code == 412
+    assert client.delete(f"/policies/{pid}", headers={**h, "If-Match": etag}).status_code == 412
+    assert client.delete(f"/policies/{pid}", headers={**h, "If-Match": '"2"'}).status_code == 200
+    assert client.patch(f"/policies/{pid}", headers=h, json={"name": "gone"}).status_code == 404
+    assert client.delete(f"/policies/{pid}", headers={**h, "If-Match": '"2"'}).status_code == 404
+
+
+def test_put_without_if_match_bumps_version():
+    register("putadmin", role="admin")
+    h = auth("putadmin")
+    pid = create(h, "Put")["id"]
+    r = client.put(f"/policies/{pid}", headers=h, json={"id": pid, "name": "Put2", "details": "x", "owner": "someone"})
+    assert r.status_code == 200
+    assert r.json() == {"id": pid, "name": "Put2", "details": "x", "owner": "someone", "version": 2}
+    since = client.get("/policies/changes", headers=h).json()["next"]
+    activity = client.get("/policies/stats", headers=h).json()["recent_activity"][0]
+    empty = client.patch(f"/policies/{pid}", headers=h, json={})
+    assert empty.json()["version"] == 2
+    # nothing was written: no change-feed entry, no activity counted
+    assert client.get("/policies/changes", headers=h, params={"since": since}).json()["changes"] == []
+    assert client.get("/policies/stats", headers=h).json()["recent_activity"][0] == activity
+    assert client.patch(f"/policies/{pid}", headers={**h, "If-Match": '"1"'}, json={}).status_code == 412
+    assert client.patch("/policies/999999", headers=h, json={}).status_code == 404
+
+
+def test_batch_patch_delete_reassign():
+    register("batchadmin", role="admin")
+    h = auth("batchadmin")
+    a, b, c, d = (create(h, f"Batch {i}") for i in range(4))
+    client.patch(f"/policies/{c['id']}", headers=h, json={"details": "moved on"})
+    r = client.post("/policies/batch", headers=h, json={"operations": [
+        {"op": "patch", "id": a["id"], "changes": {"owner": "batchheir"}, "if_match": 1},
+        {"op": "delete", "id": b["id"]},
+        {"op": "patch", "id": c["id"], "changes": {"owner": "batchheir"}, "if_match": 1},
+        {"op": "delete", "id": 999999},
+        {"op": "delete", "id": a["id"]},
+        {"op": "reassign", "from_owner": "batchadmin", "to_owner": "batchheir"},
+    ]})
+    assert r.status_code == 200 and r.json()["committed"] is True
+    results = r.json()["results"]
+    assert [x["status"] for x in results] == [200, 200, 412, 404, 422, 200]
+    assert results[0]["policy"] == {**a, "owner": "batchheir", "version": 2}
+    assert results[5]["updated"] == 2  # c and d
+    owners = {p["id"]: (p["owner"], p["version"]) for p in client.get("/policies", headers=h, params={"owner": "batchheir"}).json()}
+    assert owners == {a["id"]: ("batchheir", 2), c["id"]: ("batchheir", 3), d["id"]: ("batchheir", 2)}
+
+
+def test_batch_atomic_rolls_back_on_failure():
+    register("atomicadmin", role="admin")
+    h = auth("atomicadmin")
+    pid = create(h, "Atomic")["id"]
+    r = client.post("/policies/batch", headers=h, json={"atomic": True, "operations": [
+        {"op": "delete", "id": pid},
+        {"op": "patch", "id": 999999, "changes": {"name": "x"}},
+    ]})
+    assert r.json()["committed"] is False
+    assert [x["status"] for x in r.json()["results"]] == [424, 404]
+    assert client.get("/policies", headers=h, params={"owner": "atomicadmin"}).json()[0]["id"] == pid
+    register("batchuser")
+    assert client.post("/policies/batch", headers=auth("batchuser"),
+                       json={"operations": [{"op": "delete", "id": pid}]}).status_code == 403
+
+
+def test_full_text_search_ranked_and_paginated():
+    register("searcher")
+    h = auth("searcher")
+    in_details = create(h, "Home cover", "includes flooding damage")
+    in_name = create(h, "Flood insurance", "riverside homes")
+    create(h, "Car", "collision only")
+    r = client.get("/policies/search", headers=h, params={"q": "flood"})
+    assert r.status_code == 200
+    assert [p["id"] for p in r.json()] == [in_name["id"], in_details["id"]]  # name matches rank first
+    page = client.get("/policies/search", headers=h, params={"q": "flood", "limit": 1})
+    assert [p["id"] for p in page.json()] == [in_name["id"]]
+    rest = client.get("/policies/search", headers=h, params={"q": "flood", "limit": 1, "cursor": page.headers["X-Next-Cursor"]})
+    assert [p["id"] for p in rest.json()] == [in_details["id"]] and "X-Next-Cursor" not in rest.headers
+    # the index follows updates and deletes; punctuation is not query syntax
+    register("searchadmin", role="admin")
+    admin = auth("searchadmin")
+    client.patch(f"/policies/{in_name['id']}", headers=admin, json={"name": "Storm insurance", "details": "coastal"})
+    client.delete(f"/policies/{in_details['id']}", headers=admin)
+    assert client.get("/policies/search", headers=h, params={"q": "flood"}).json() == []
+    assert [p["id"] for p in client.get("/policies/search", headers=h, params={"q": '"sto*" -(ins'}).json()] == [in_name["id"]]
+    register("nosearch")
+    assert client.get("/policies/search", headers=auth("nosearch"), params={"q": "storm"}).json() == []
+
+
+def test_stats_follow_every_write():
+    register("statsuser")
+    register("statsadmin", role="admin")
+    h, admin = auth("statsuser"), auth("statsadmin")
+    ids = [create(h, f"Stat {i}")["id"] for i in range(3)]
+    mine = client.get("/policies/stats", headers=h, params={"days": 2}).json()
+    assert (mine["total"], mine["owners"], mine["by_owner"]) == (3, 1, [{"owner": "statsuser", "policies": 3}])
+    assert len(mine["recent_activity"]) == 2
+    assert mine["recent_activity"][0] == {"day": mine["recent_activity"][0]["day"], "created": 3, "updated": 0, "deleted": 0}
+
+    assert client.patch(f"/policies/{ids[0]}", headers=admin, json={"owner": "statsother"}).status_code == 200
+    assert client.delete(f"/policies/{ids[1]}", headers=admin).status_code == 200
+    mine = client.get("/policies/stats", headers=h).json()
+    assert mine["total"] == 1
+    assert mine["recent_activity"][0]["deleted"] == 1
+    everyone = client.get("/policies/stats", headers=admin, params={"limit": 1000}).json()
+    with engine.connect() as conn:
+        assert everyone["total"] == conn.exec_driver_sql("SELECT count(*) FROM policies").scalar_one()
+    assert {"owner": "statsother", "policies": 1} in everyone["by_owner"]
+    assert everyone["owners"] == len(everyone["by_owner"])
+
+
+def test_change_feed_replays_writes_per_caller():
+    register("feeduser")
+    register("feedadmin", role="admin")
+    h, admin = auth("feeduser"), auth("feedadmin")
+    start = client.get("/policies/changes", headers=h).json()
+    assert start["changes"] == [] and start["more"] is False
+    a, b, c = (create(h, f"Feed {i}")["id"] for i in range(3))
+    assert client.patch(f"/policies/{a}", headers=admin, json={"details": "edited"}).status_code == 200
+    assert client.patch(f"/policies/{b}", headers=admin, json={"owner": "feedother"}).status_code == 200
+    assert client.delete(f"/policies/{c}", headers=admin).status_code == 200
+
+    page = client.get("/policies/changes", headers=h, params={"since": start["next"], "limit": 2}).json()
+    assert page["more"] is True
+    assert [(ch["op"], ch["id"]) for ch in page["changes"]] == [("upsert", a), ("delete", b)]  # b moved away
+    assert page["changes"][0]["policy"]["details"] == "edited"
+    rest = client.get("/policies/changes", headers=h, params={"since": page["next"]}).json()
+    assert [(ch["op"], ch["id"]) for ch in rest["changes"]] == [("delete", c)]
+    assert rest["more"] is False
+    everything = client.get("/policies/changes", headers=admin, params={"since": start["next"]}).json()
+    assert ("upsert", b, "feedother") in [(ch["op"], ch["id"], ch.get("policy", {}).get("owner")) for ch in everything["changes"]]
+
+    quiet = client.get("/policies/changes", headers=h, params={"since": rest["next"], "wait": 0.3}).json()
+    assert quiet == {"changes": [], "next": rest["next"], "more": False}
+    assert client.get("/policies/changes", headers=h, params={"since": rest["next"] + 1000}).status_code == 410
+
+
+def test_change_feed_gone_only_below_pruned_changes(monkeypatch):
+    from backend import main
+    register("pruneuser")
+    h = auth("pruneuser")
+    start = client.get("/policies/changes", headers=h).json()
+    create(h, "Prune old")
+    kept = client.get("/policies/changes", headers=h, params={"since": start["next"]}).json()
+    monkeypatch.setattr(main, "CHANGE_LOG_RETENTION_HOURS", -1)  # everything so far has expired
+    main.prune_change_log()
+    new = create(h, "Prune new")["id"]
+
+    assert client.get("/policies/changes", headers=h, params={"since": start["next"]}).status_code == 410
+    page = client.get("/policies/changes", headers=h, params={"since": kept["next"]}).json()
+    assert [(ch["op"], ch["id"]) for ch in page["changes"]] == [("upsert", new)]  # the marker is not a change
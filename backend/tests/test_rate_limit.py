@@ -0,0 +1,83 @@
+import os, sys, multiprocessing
+TEST_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "rate_limit.db")
+if os.path.exists(TEST_DB_PATH):
+    os.remove(TEST_DB_PATH)
+os.environ["DB_URL"] = "sqlite:///" + TEST_DB_PATH
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from fastapi.testclient import TestClient
+from backend import main
+from backend.rate_limit import Limit, MemoryBucketStore, SharedBucketStore, parse_limit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    store = MemoryBucketStore(clock=clock)
+    limit = parse_limit("3/6")  # 0.5 tokens/s, bursts of 3
+    assert [store.take("k", limit) for _ in range(3)] == [0, 0, 0]
+    assert store.take("k", limit) == 2.0
+    assert store.take("other", limit) == 0  # separate bucket
+    clock.now += 2
+    assert store.take("k", limit) == 0
+    assert store.take("k", limit) > 0
+
+
+def test_shared_store_visible_across_fork():
+    store = SharedBucketStore(slots=64)
+    limit = Limit(0.001, 2)
+    child = multiprocessing.get_context("fork").Process(target=store.take, args=("alice", limit))
+    child.start()
+    child.join()
+    assert store.take("alice", limit) == 0
+    assert store.take("alice", limit) > 0  # the child's request used the other token
+    assert store.take("bob", limit) == 0
+
+
+def test_shared_store_colliding_keys_stay_throttled():
+    clock = FakeClock()
+    store = SharedBucketStore(slots=2, clock=clock)  # one set: every key collides
+    limit = Limit(0.001, 2)
+    assert [store.take(k, limit) for k in ("a", "b", "a", "b")] == [0, 0, 0, 0]
+    assert store.take("a", limit) > 0 and store.take("b", limit) > 0  # two keys keep their own buckets
+    # cycling more keys than the set holds inherits spent buckets instead of fresh ones
+    assert all(store.take(k, limit) > 0 for k in ("c", "d", "e", "a", "b", "c"))
+    clock.now += 1000  # one token back per bucket
+    assert store.take("a", limit) == 0
+
+
+def test_limits_per_route_class_and_client(monkeypatch):
+    monkeypatch.setattr(main, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(main, "RATE_LIMITS", {"auth": Limit(1 / 60, 2), "read": Limit(1 / 60, 2)})
+    monkeypatch.setattr(main, "rate_limit_store", MemoryBucketStore())
+    client = TestClient(main.create_app())
+    tokens = [client.post("/register", json={"username": f"rl{i}", "password": "pass", "role": "user"}).json()["access_token"]
+              for i in range(2)]
+    r = client.post("/login-json", json={"username": "rl0", "password": "pass"})  # 3rd auth call from this IP
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "60"
+    before = main.RATE_LIMITED.value("auth")
+    for token in tokens:  # reads are budgeted per user, not per IP
+        headers = {"Authorization": f"Bearer {token}"}
+        assert [client.get("/policies", headers=headers).status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get("/health").status_code == 200  # unclassified routes are never limited
+    assert main.RATE_LIMITED.value("read") >= 2 and main.RATE_LIMITED.value("auth") == before
+
+
+def test_bearer_token_does_not_reset_login_budget(monkeypatch):
+    monkeypatch.setattr(main, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(main, "RATE_LIMITS", {"auth": Limit(1 / 60, 3)})
+    monkeypatch.setattr(main, "rate_limit_store", MemoryBucketStore())
+    client = TestClient(main.create_app())
+    token = client.post("/register", json={"username": "rlbearer", "password": "pass", "role": "user"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    guesses = [client.post("/login-json", headers=headers, json={"username": "rlvictim", "password": "guess"}).status_code
+               for _ in range(3)]
+    assert guesses == [400, 400, 429]  # the registration already spent one of the IP's three
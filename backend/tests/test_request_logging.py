@@ -0,0 +1,57 @@
+import os, sys, logging
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from backend.request_logging import RequestLogMiddleware, mask_passwords
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_client(**middleware_kwargs):
+    log = logging.getLogger(f"test.request_logging.{len(middleware_kwargs)}.{id(middleware_kwargs)}")
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    handler = ListHandler()
+    log.addHandler(handler)
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        request.state.principal = {"username": "alice", "role": "user"}
+        return {"size": len(await request.body())}
+
+    app.add_middleware(RequestLogMiddleware, logger=log, **middleware_kwargs)
+    return TestClient(app), handler.records
+
+
+def test_single_record_with_principal_and_capped_masked_body():
+    client, records = make_client(capture_body=True, body_max_bytes=40)
+    r = client.post("/echo", json={"user": "alice", "password": "s3cret-value-long"})
+    assert r.json()["size"] > 40  # the app still receives the full body
+    assert len(records) == 1
+    rec = records[0]
+    assert rec.msg == "request.end" and rec.status_code == 200 and rec.status_text == "OK"
+    assert (rec.username, rec.role) == ("alice", "user")
+    assert len(rec.body_excerpt) <= 40 and "s3cret" not in rec.body_excerpt
+    assert rec.request_size == int(r.request.headers["content-length"])
+
+
+def test_successes_sampled_errors_always_logged():
+    client, records = make_client(sample_rate=0.0)
+    client.post("/echo", json={})
+    client.get("/nope")
+    assert [r.status_code for r in records] == [404]
+    assert records[0].levelno == logging.ERROR
+
+
+def test_mask_passwords_form_and_json():
+    assert mask_passwords("username=a&password=hunter2&x=1") == "username=a&password=***&x=1"
+    assert mask_passwords('{"password": "abc') == '{"password": "***'
@@ -0,0 +1,17 @@
+import os, sys, json
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from backend import serialization
+
+ROWS = [(1, "Hausrat Überschwemmung", None, "zoë", 1), (2, 'quote " and \\ slash', "d", "bob", 3)]
+
+
+def test_encode_policies_without_orjson_matches(monkeypatch):
+    fast = serialization.encode_policies(ROWS)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.encode_policies(ROWS) == fast  # same bytes either way
+    assert json.loads(serialization.encode_policies(ROWS)) == [
+        {"id": 1, "name": "Hausrat Überschwemmung", "details": "", "owner": "zoë", "version": 1},
+        {"id": 2, "name": 'quote " and \\ slash', "details": "d", "owner": "bob", "version": 3},
+    ]
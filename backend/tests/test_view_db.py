@@ -0,0 +1,48 @@
+import os, sys, csv, json
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from db.database import Base
+from db.models import UserORM, PolicyORM
+import view_db
+
+
+def seed(tmp_path):
+    url = f"sqlite:///{tmp_path / 'view.db'}"
+    eng = create_engine(url)
+    Base.metadata.create_all(bind=eng)
+    with Session(eng) as db:
+        db.add_all([UserORM(username="alice", password="h", role="user"), UserORM(username="root", password="h", role="admin")])
+        db.add_all([PolicyORM(name=f"P{i}", details="d", owner="alice" if i % 2 else "bob") for i in range(1, 11)])
+        db.commit()
+    return url
+
+
+def test_counts_and_summary_use_filters(tmp_path):
+    url = seed(tmp_path)
+    assert view_db.counts(url) == {"users": 2, "policies": 10}
+    assert view_db.counts(url, ("policies",), owner="alice", since_id=5) == {"policies": 2}
+    stats = view_db.summary(url)
+    assert stats["users"]["by_role"] == {"user": 1, "admin": 1}
+    assert stats["policies"]["top_owners"][0] == {"owner": "alice", "policies": 5}
+
+
+def test_ndjson_export_streams_filtered_rows(tmp_path):
+    url = seed(tmp_path)
+    out = tmp_path / "p.ndjson"
+    view_db.dump(url, ("policies",), "ndjson", str(out), limit=2, owner="bob", since_id=2)
+    rows = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [r["id"] for r in rows] == [4, 6]
+    assert set(rows[0]) == {"id", "name", "details", "owner"}
+
+
+def test_csv_export_rows_match_header(tmp_path):
+    url = seed(tmp_path)
+    out = tmp_path / "p.csv"
+    view_db.dump(url, ("policies",), "csv", str(out), limit=2, owner="alice")
+    with open(out, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["id", "name", "details", "owner"]
+    assert rows[1:] == [["1", "P1", "d", "alice"], ["3", "P3", "d", "alice"]]
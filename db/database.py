@@ -1,15 +1,88 @@
 import os
+import threading
+from typing import Union
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 DB_URL = os.getenv("DB_URL", "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.db"))
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# DB_ASYNC=1 serves requests through an AsyncSession (asyncpg / aiosqlite) instead of the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+
+# Pool tuning (ignored for SQLite, whose file connections are cheap and local)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; stay under server/LB idle timeouts
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def engine_kwargs(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def async_url(url: str) -> str:
+    """Map a sync DB_URL (sqlite://, postgresql[+psycopg2]://) to its async driver."""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(hide_password=False)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
+# Engines are created on first use (normally the app's lifespan startup), so importing this module
+# resolves no dialect and imports no DB driver. `from db.database import engine` still works; it
+# creates the engine at that point.
+_engine = None
+_engine_lock = threading.Lock()
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+    DBSession = Union[Session, AsyncSession]
+else:
+    DBSession = Session
+
+def get_engine():
+    """The process-wide Engine; the first call creates it (and the async engine under DB_ASYNC)
+    and binds the session factories to it."""
+    global _engine, async_engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if DB_ASYNC:
+                    kwargs = engine_kwargs(DB_URL)
+                    kwargs.pop("connect_args", None)  # check_same_thread is meaningless for aiosqlite
+                    async_engine = create_async_engine(async_url(DB_URL), **kwargs)
+                    AsyncSessionLocal.configure(bind=async_engine)
+                engine = create_engine(DB_URL, **engine_kwargs(DB_URL))
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def __getattr__(name):
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Request-scoped session dependency for the API: AsyncSession when DB_ASYNC is set, else Session
+get_session = get_async_db if DB_ASYNC else get_db
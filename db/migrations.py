@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Incremental schema migrations applied on top of `Base.metadata.create_all`.
+
+`create_all` only creates missing tables, so indexes and columns added to models later never
+reach an existing SQLite or Postgres database. Each migration below runs once, in its own
+transaction, and is recorded in `schema_migrations`. Usage:
+    python -m db.migrations            # apply pending migrations to DB_URL
+    python -m db.migrations --explain  # print query plans for the hot queries
+"""
+import argparse
+import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, func, insert, inspect, select, text
+from .models import PolicyActivityORM, PolicyChangeORM, PolicyListVersionORM, PolicyORM, PolicyOwnerStatsORM
+from .queries import (TS_CONFIG, policy_by_id_query, policy_changes_query, policy_list_query, policy_list_version_query,
+                      policy_owner_stats_query, policy_search_query)
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []  # (version, name, fn(conn)), applied in version order
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+def _model_index(table, name):
+    return next(ix for ix in table.indexes if ix.name == name)
+
+@migration(1, "policies (owner, id) and name indexes")
+def _policy_indexes(conn):
+    # Plain CREATE INDEX: on a large Postgres table build these by hand with CONCURRENTLY first;
+    # checkfirst then turns this migration into a no-op.
+    for name in ("ix_policies_owner_id", "ix_policies_name"):
+        _model_index(PolicyORM.__table__, name).create(conn, checkfirst=True)
+
+@migration(2, "policies.version for optimistic concurrency")
+def _policy_version(conn):
+    if "version" not in {c["name"] for c in inspect(conn).get_columns("policies")}:
+        conn.execute(text("ALTER TABLE policies ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+# External-content FTS5 table: stores only the index, kept in step with `policies` by triggers,
+# so every writer (API routes, bulk import, batch, raw SQL) updates it in the same transaction.
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS policies_fts USING fts5("
+    "name, details, content='policies', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS policies_fts_ai AFTER INSERT ON policies BEGIN "
+    "INSERT INTO policies_fts(rowid, name, details) VALUES (new.id, new.name, new.details); END",
+    "CREATE TRIGGER IF NOT EXISTS policies_fts_ad AFTER DELETE ON policies BEGIN "
+    "INSERT INTO policies_fts(policies_fts, rowid, name, details) VALUES ('delete', old.id, old.name, old.details); END",
+    "CREATE TRIGGER IF NOT EXISTS policies_fts_au AFTER UPDATE OF name, details ON policies BEGIN "
+    "INSERT INTO policies_fts(policies_fts, rowid, name, details) VALUES ('delete', old.id, old.name, old.details); "
+    "INSERT INTO policies_fts(rowid, name, details) VALUES (new.id, new.name, new.details); END",
+    "INSERT INTO policies_fts(policies_fts) VALUES ('rebuild')",  # index rows that predate the table
+    "INSERT INTO policies_fts(policies_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",  # name hits outrank details
+)
+# A generated column needs no write hooks at all; name is weighted above details for ts_rank.
+POSTGRES_FTS_DDL = (
+    "ALTER TABLE policies ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{TS_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{TS_CONFIG}', coalesce(details, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_policies_search ON policies USING GIN (search_vector)",
+)
+
+@migration(3, "full-text search over policy name and details")
+def _policy_search(conn):
+    # On Postgres adding the stored column rewrites the table; on a large one run it off-peak.
+    ddl = {"sqlite": SQLITE_FTS_DDL, "postgresql": POSTGRES_FTS_DDL}.get(conn.dialect.name, ())
+    for statement in ddl:
+        conn.exec_driver_sql(statement)
+
+# Per-owner counts and per-day activity, maintained by row triggers in the writing transaction.
+# An owner whose last policy goes away loses its row, so the row count is the number of owners.
+SQLITE_STATS_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS policies_stats_ai AFTER INSERT ON policies BEGIN "
+    "INSERT INTO policy_owner_stats(owner, policies) VALUES (new.owner, 1) "
+    "ON CONFLICT(owner) DO UPDATE SET policies = policies + 1; "
+    "INSERT INTO policy_activity(day, owner, created, updated, deleted) VALUES (date('now'), new.owner, 1, 0, 0) "
+    "ON CONFLICT(day, owner) DO UPDATE SET created = created + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS policies_stats_ad AFTER DELETE ON policies BEGIN "
+    "UPDATE policy_owner_stats SET policies = policies - 1 WHERE owner = old.owner; "
+    "DELETE FROM policy_owner_stats WHERE owner = old.owner AND policies <= 0; "
+    "INSERT INTO policy_activity(day, owner, created, updated, deleted) VALUES (date('now'), old.owner, 0, 0, 1) "
+    "ON CONFLICT(day, owner) DO UPDATE SET deleted = deleted + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS policies_stats_au AFTER UPDATE ON policies BEGIN "
+    "INSERT INTO policy_activity(day, owner, created, updated, deleted) VALUES (date('now'), new.owner, 0, 1, 0) "
+    "ON CONFLICT(day, owner) DO UPDATE SET updated = updated + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS policies_stats_au_owner AFTER UPDATE OF owner ON policies "
+    "WHEN new.owner IS NOT old.owner BEGIN "
+    "UPDATE policy_owner_stats SET policies = policies - 1 WHERE owner = old.owner; "
+    "DELETE FROM policy_owner_stats WHERE owner = old.owner AND policies <= 0; "
+    "INSERT INTO policy_owner_stats(owner, policies) VALUES (new.owner, 1) "
+    "ON CONFLICT(owner) DO UPDATE SET policies = policies + 1; END",
+)
+POSTGRES_STATS_DDL = (
+    """CREATE OR REPLACE FUNCTION policies_stats() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        actor text;   -- owner the activity is counted for
+        gone text;    -- owner losing a policy
+        gained text;  -- owner gaining one
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            actor := NEW.owner;
+            gained := NEW.owner;
+        ELSIF TG_OP = 'DELETE' THEN
+            actor := OLD.owner;
+            gone := OLD.owner;
+        ELSE
+            actor := NEW.owner;
+            IF NEW.owner IS DISTINCT FROM OLD.owner THEN
+                gone := OLD.owner;
+                gained := NEW.owner;
+            END IF;
+        END IF;
+        IF gone IS NOT NULL THEN
+            UPDATE policy_owner_stats SET policies = policies - 1 WHERE owner = gone;
+            DELETE FROM policy_owner_stats WHERE owner = gone AND policies <= 0;
+        END IF;
+        IF gained IS NOT NULL THEN
+            INSERT INTO policy_owner_stats(owner, policies) VALUES (gained, 1)
+            ON CONFLICT (owner) DO UPDATE SET policies = policy_owner_stats.policies + 1;
+        END IF;
+        INSERT INTO policy_activity(day, owner, created, updated, deleted)
+        VALUES ((now() AT TIME ZONE 'utc')::date, actor,
+                (TG_OP = 'INSERT')::int, (TG_OP = 'UPDATE')::int, (TG_OP = 'DELETE')::int)
+        ON CONFLICT (day, owner) DO UPDATE SET created = policy_activity.created + EXCLUDED.created,
+            updated = policy_activity.updated + EXCLUDED.updated, deleted = policy_activity.deleted + EXCLUDED.deleted;
+        RETURN NULL;
+    END $$""",
+    "DROP TRIGGER IF EXISTS policies_stats ON policies",
+    "CREATE TRIGGER policies_stats AFTER INSERT OR UPDATE OR DELETE ON policies "
+    "FOR EACH ROW EXECUTE FUNCTION policies_stats()",
+)
+
+@migration(4, "policy statistics summary tables")
+def _policy_stats(conn):
+    for model in (PolicyOwnerStatsORM, PolicyActivityORM):
+        model.__table__.create(conn, checkfirst=True)
+    # Activity has no history to rebuild from; owner counts are backfilled from the table once.
+    ddl = {"sqlite": SQLITE_STATS_DDL, "postgresql": POSTGRES_STATS_DDL}.get(conn.dialect.name, ())
+    for statement in ddl:
+        conn.exec_driver_sql(statement)
+    conn.execute(delete(PolicyOwnerStatsORM.__table__))
+    conn.execute(insert(PolicyOwnerStatsORM.__table__).from_select(
+        ["owner", "policies"], select(PolicyORM.owner, func.count()).group_by(PolicyORM.owner)))
+
+# Change log triggers. On Postgres, sequence values are handed out before commit, so two
+# concurrent writers could commit out of seq order and a reader could skip past the slower one;
+# the transaction-scoped advisory lock makes change-log writers take seqs in commit order.
+# Migration 7 replaces the lock with transaction-ordered seqs.
+SQLITE_CHANGES_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS policies_changes_ai AFTER INSERT ON policies BEGIN "
+    "INSERT INTO policy_changes(policy_id, op, owner, changed_at) "
+    "VALUES (new.id, 'insert', new.owner, CURRENT_TIMESTAMP); END",
+    "CREATE TRIGGER IF NOT EXISTS policies_changes_au AFTER UPDATE ON policies BEGIN "
+    "INSERT INTO policy_changes(policy_id, op, owner, previous_owner, changed_at) "
+    "VALUES (new.id, 'update', new.owner, CASE WHEN new.owner IS NOT old.owner THEN old.owner END, CURRENT_TIMESTAMP); END",
+    "CREATE TRIGGER IF NOT EXISTS policies_changes_ad AFTER DELETE ON policies BEGIN "
+    "INSERT INTO policy_changes(policy_id, op, owner, changed_at) "
+    "VALUES (old.id, 'delete', old.owner, CURRENT_TIMESTAMP); END",
+)
+POSTGRES_CHANGES_DDL = (
+    """CREATE OR REPLACE FUNCTION policies_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock(74202);
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO policy_changes(policy_id, op, owner, changed_at)
+            VALUES (OLD.id, 'delete', OLD.owner, now() AT TIME ZONE 'utc');
+        ELSE
+            INSERT INTO policy_changes(policy_id, op, owner, previous_owner, changed_at)
+            VALUES (NEW.id, lower(TG_OP), NEW.owner,
+                    CASE WHEN TG_OP = 'UPDATE' AND NEW.owner IS DISTINCT FROM OLD.owner THEN OLD.owner END,
+                    now() AT TIME ZONE 'utc');
+        END IF;
+        RETURN NULL;
+    END $$""",
+    "DROP TRIGGER IF EXISTS policies_changes ON policies",
+    "CREATE TRIGGER policies_changes AFTER INSERT OR UPDATE OR DELETE ON policies "
+    "FOR EACH ROW EXECUTE FUNCTION policies_changes()",
+)
+
+@migration(5, "policy change log")
+def _policy_changes(conn):
+    PolicyChangeORM.__table__.create(conn, checkfirst=True)
+    ddl = {"sqlite": SQLITE_CHANGES_DDL, "postgresql": POSTGRES_CHANGES_DDL}.get(conn.dialect.name, ())
+    for statement in ddl:
+        conn.exec_driver_sql(statement)
+
+# List version triggers: every write bumps the counter of the owner after it and, when that
+# differs, the owner before it. On Postgres both rows are locked in owner order, so two moves in
+# opposite directions cannot deadlock on them.
+_SQLITE_BUMP = ("INSERT INTO policy_list_versions(owner, version) VALUES ({}, 1) "
+                "ON CONFLICT(owner) DO UPDATE SET version = version + 1;")
+SQLITE_LIST_VERSIONS_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS policies_list_versions_ai AFTER INSERT ON policies BEGIN "
+    + _SQLITE_BUMP.format("new.owner") + " END",
+    "CREATE TRIGGER IF NOT EXISTS policies_list_versions_ad AFTER DELETE ON policies BEGIN "
+    + _SQLITE_BUMP.format("old.owner") + " END",
+    "CREATE TRIGGER IF NOT EXISTS policies_list_versions_au AFTER UPDATE ON policies BEGIN "
+    + _SQLITE_BUMP.format("new.owner") + " END",
+    "CREATE TRIGGER IF NOT EXISTS policies_list_versions_au_owner AFTER UPDATE OF owner ON policies "
+    "WHEN new.owner IS NOT old.owner BEGIN " + _SQLITE_BUMP.format("old.owner") + " END",
+)
+POSTGRES_LIST_VERSIONS_DDL = (
+    """CREATE OR REPLACE FUNCTION policies_list_versions() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        owners text[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            owners := ARRAY[NEW.owner];
+        ELSIF TG_OP = 'DELETE' THEN
+            owners := ARRAY[OLD.owner];
+        ELSIF NEW.owner IS DISTINCT FROM OLD.owner THEN
+            owners := ARRAY[NEW.owner, OLD.owner];
+        ELSE
+            owners := ARRAY[NEW.owner];
+        END IF;
+        INSERT INTO policy_list_versions(owner, version)
+        SELECT o, 1 FROM unnest(owners) AS o ORDER BY o
+        ON CONFLICT (owner) DO UPDATE SET version = policy_list_versions.version + 1;
+        RETURN NULL;
+    END $$""",
+    "DROP TRIGGER IF EXISTS policies_list_versions ON policies",
+    "CREATE TRIGGER policies_list_versions AFTER INSERT OR UPDATE OR DELETE ON policies "
+    "FOR EACH ROW EXECUTE FUNCTION policies_list_versions()",
+)
+
+@migration(6, "per-owner list versions for ETags")
+def _policy_list_versions(conn):
+    # No backfill: an owner without a row is at version 0, and the first write creates the row.
+    PolicyListVersionORM.__table__.create(conn, checkfirst=True)
+    ddl = {"sqlite": SQLITE_LIST_VERSIONS_DDL, "postgresql": POSTGRES_LIST_VERSIONS_DDL}.get(conn.dialect.name, ())
+    for statement in ddl:
+        conn.exec_driver_sql(statement)
+
+# On Postgres, seq is (transaction id << 20) | n, n counting the transaction's changes, so
+# writers never wait on each other and every seq below (oldest running transaction << 20) is
+# final: readers stop there (policy_changes_head_query). The xid stays below 2^33 for the first
+# 4 billion transactions, which keeps seqs exact as JSON numbers in browsers.
+POSTGRES_CHANGES_XID_DDL = (
+    """CREATE OR REPLACE FUNCTION policies_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        n bigint := coalesce(nullif(current_setting('policies_changes.n', true), ''), '0')::bigint + 1;
+        change_seq bigint;
+    BEGIN
+        IF n >= 1048576 THEN
+            RAISE EXCEPTION 'more than 1048575 policy changes in one transaction';
+        END IF;
+        PERFORM set_config('policies_changes.n', n::text, true);
+        change_seq := (pg_current_xact_id()::text::bigint << 20) | n;
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO policy_changes(seq, policy_id, op, owner, changed_at)
+            VALUES (change_seq, OLD.id, 'delete', OLD.owner, now() AT TIME ZONE 'utc');
+        ELSE
+            INSERT INTO policy_changes(seq, policy_id, op, owner, previous_owner, changed_at)
+            VALUES (change_seq, NEW.id, lower(TG_OP), NEW.owner,
+                    CASE WHEN TG_OP = 'UPDATE' AND NEW.owner IS DISTINCT FROM OLD.owner THEN OLD.owner END,
+                    now() AT TIME ZONE 'utc');
+        END IF;
+        RETURN NULL;
+    END $$""",
+)
+
+@migration(7, "transaction-ordered change seqs")
+def _policy_changes_xid(conn):
+    # Existing seqs came from the serial sequence and sit far below the new ones, so cursors
+    # handed out before this migration keep working. SQLite writers are already serialised.
+    for statement in {"postgresql": POSTGRES_CHANGES_XID_DDL}.get(conn.dialect.name, ()):
+        conn.exec_driver_sql(statement)
+
+def _lock(conn):
+    """Serialise concurrent migrators (several app processes starting at once) on Postgres."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(74201)"))
+
+def migrate(engine):
+    """Apply pending migrations; returns the versions applied by this call."""
+    migration_metadata.create_all(bind=engine)
+    applied = []
+    for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        with engine.begin() as conn:
+            _lock(conn)
+            done = conn.execute(select(schema_migrations.c.version).where(schema_migrations.c.version==version)).first()
+            if done:
+                continue
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.datetime.utcnow()))
+            applied.append(version)
+    return applied
+
+def hot_queries(dialect_name: str):
+    """Representative statements for the request paths that must stay index-backed."""
+    return {
+        "list_own_policies": policy_list_query(dialect_name, visible_to="alice").limit(50),
+        "list_own_policies_next_page": policy_list_query(dialect_name, visible_to="alice", cursor=1000).limit(50),
+        "list_by_name_prefix": policy_list_query(dialect_name, name_prefix="Life").limit(50),
+        "get_policy_by_id": policy_by_id_query(1),
+        "search_policies": policy_search_query(dialect_name, ["life"]).limit(50),
+        "policy_stats_by_owner": policy_owner_stats_query().limit(100),
+        "policy_changes_since": policy_changes_query(1000, 2000, 1000, visible_to="alice"),
+        "policy_list_version": policy_list_version_query("alice"),
+    }
+
+def explain(engine, stmt):
+    """Return the database's query plan for `stmt` as a list of lines."""
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+        return [row[0] for row in conn.exec_driver_sql("EXPLAIN " + sql)]
+
+def explain_hot_queries(engine):
+    return {name: explain(engine, stmt) for name, stmt in hot_queries(engine.dialect.name).items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations (uses DB_URL)")
+    parser.add_argument("--explain", action="store_true", help="Print query plans for the hot queries")
+    args = parser.parse_args()
+    from .database import engine, Base
+    Base.metadata.create_all(bind=engine)
+    print("Applied migrations:", migrate(engine) or "none pending")
+    if args.explain:
+        for name, plan in explain_hot_queries(engine).items():
+            print(f"{name}:")
+            for line in plan:
+                print(f"  {line}")
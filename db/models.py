@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import BigInteger, Column, Date, DateTime, Index, Integer, String, Text
 from .database import Base
 
 class UserORM(Base):
@@ -12,4 +12,55 @@ class PolicyORM(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), nullable=False)
     details = Column(Text, nullable=True)
-    owner = Column(String(100), nullable=False)
\ No newline at end of file
+    owner = Column(String(100), nullable=False)
+    # bumped by every write; served as the ETag and checked against If-Match
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    __table_args__ = (
+        # non-admin listing: WHERE owner=? ORDER BY id (keyset pagination)
+        Index("ix_policies_owner_id", "owner", "id"),
+        # name prefix search; text_pattern_ops lets Postgres use it for LIKE 'abc%'
+        Index("ix_policies_name", "name", postgresql_ops={"name": "text_pattern_ops"}),
+    )
+
+# Summary tables kept current by triggers on `policies` (migration 4), so they change in the same
+# transaction as every write, whichever code path makes it.
+class PolicyOwnerStatsORM(Base):
+    __tablename__ = "policy_owner_stats"
+    owner = Column(String(100), primary_key=True)
+    policies = Column(Integer, nullable=False, default=0, server_default="0")
+
+class PolicyActivityORM(Base):
+    __tablename__ = "policy_activity"
+    day = Column(Date, primary_key=True)  # UTC
+    owner = Column(String(100), primary_key=True)
+    created = Column(Integer, nullable=False, default=0, server_default="0")
+    updated = Column(Integer, nullable=False, default=0, server_default="0")
+    deleted = Column(Integer, nullable=False, default=0, server_default="0")
+
+# Per-owner write counters bumped by triggers on `policies` (migration 6). List ETags are built
+# from them, so every host and every writer agrees on them; rows are never deleted, so a counter
+# never goes back to a value it had.
+class PolicyListVersionORM(Base):
+    __tablename__ = "policy_list_versions"
+    owner = Column(String(100), primary_key=True)
+    version = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0, server_default="0")
+
+# Append-only log of policy writes, filled by triggers on `policies` (migration 5) and read by
+# GET /policies/changes. `seq` is never reused; readers only go up to a head below which no
+# change is still uncommitted (policy_changes_head_query). Pruning leaves its newest expired
+# row behind as op 'pruned', marking how far back the log reaches.
+class PolicyChangeORM(Base):
+    __tablename__ = "policy_changes"
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    policy_id = Column(Integer, nullable=False)
+    op = Column(String(6), nullable=False)  # insert / update / delete / pruned
+    owner = Column(String(100), nullable=False)  # after the change (before it, for deletes)
+    previous_owner = Column(String(100), nullable=True)  # set when an update moved the policy
+    changed_at = Column(DateTime, nullable=False)  # UTC
+    __table_args__ = (
+        # non-admin feeds: changes to policies the caller owns or used to own
+        Index("ix_policy_changes_owner_seq", "owner", "seq"),
+        Index("ix_policy_changes_previous_owner_seq", "previous_owner", "seq"),
+        Index("ix_policy_changes_changed_at", "changed_at"),  # retention pruning
+        {"sqlite_autoincrement": True},
+    )
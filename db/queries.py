@@ -0,0 +1,145 @@
+"""Shared SELECT builders for the hot policy queries.
+
+Used by the API routes and by `db.migrations --explain`, so the plans we inspect are the
+plans production actually runs.
+"""
+import re
+from typing import Optional
+from sqlalchemy import and_, column, func, literal_column, or_, select, table
+from .models import PolicyActivityORM, PolicyChangeORM, PolicyListVersionORM, PolicyORM, PolicyOwnerStatsORM
+
+POLICY_COLUMNS = (PolicyORM.id, PolicyORM.name, PolicyORM.details, PolicyORM.owner, PolicyORM.version)
+# Full-text index over name/details, created by migration 3 (FTS5 on SQLite, tsvector + GIN on Postgres)
+POLICIES_FTS = table("policies_fts", column("rowid"), column("rank"))
+SEARCH_VECTOR = literal_column("policies.search_vector")
+TS_CONFIG = "english"
+MAX_SEARCH_TERMS = 16
+_SEARCH_TERM_RE = re.compile(r"\w+")
+
+def name_prefix_filter(prefix: str, dialect_name: str):
+    """Index-friendly `name LIKE 'prefix%'`.
+
+    SQLite's LIKE is case-insensitive and cannot use the BINARY-collated ix_policies_name,
+    so there the prefix is expressed as an equivalent range instead.
+    """
+    if dialect_name == "sqlite":
+        return and_(PolicyORM.name >= prefix, PolicyORM.name < prefix + "\U0010ffff")
+    return PolicyORM.name.startswith(prefix, autoescape=True)
+
+def policy_list_query(dialect_name: str, visible_to: Optional[str] = None, owner: Optional[str] = None,
+                      name_prefix: Optional[str] = None, cursor: Optional[int] = None, order: str = "asc"):
+    """Keyset-paginated policy listing ordered by id.
+
+    `visible_to` restricts rows to one owner (non-admin callers); `owner` only narrows further.
+    """
+    stmt = select(*POLICY_COLUMNS)
+    if visible_to is not None:
+        stmt = stmt.where(PolicyORM.owner==visible_to)
+    if owner is not None:
+        stmt = stmt.where(PolicyORM.owner==owner)
+    if name_prefix:
+        stmt = stmt.where(name_prefix_filter(name_prefix, dialect_name))
+    if order == "desc":
+        if cursor is not None:
+            stmt = stmt.where(PolicyORM.id < cursor)
+        return stmt.order_by(PolicyORM.id.desc())
+    if cursor is not None:
+        stmt = stmt.where(PolicyORM.id > cursor)
+    return stmt.order_by(PolicyORM.id.asc())
+
+def policy_by_id_query(policy_id: int):
+    return select(*POLICY_COLUMNS).where(PolicyORM.id==policy_id)
+
+def search_terms(q: str):
+    """Words of a search string; punctuation is dropped so user input never reaches the
+    FTS5/tsquery syntax as operators."""
+    return _SEARCH_TERM_RE.findall(q)[:MAX_SEARCH_TERMS]
+
+def policy_search_query(dialect_name: str, terms, visible_to: Optional[str] = None, owner: Optional[str] = None):
+    """Policies whose name/details contain every term (as a word prefix), best match first.
+
+    Matching goes through the full-text index, so cost follows the number of hits rather than
+    the table size. Dialects without an index fall back to a LIKE scan.
+    """
+    if dialect_name == "sqlite":
+        match = " ".join(f'"{t}"*' for t in terms)
+        stmt = (select(*POLICY_COLUMNS)
+                .select_from(POLICIES_FTS.join(PolicyORM.__table__, PolicyORM.id==POLICIES_FTS.c.rowid))
+                .where(literal_column(POLICIES_FTS.name).op("MATCH")(match))
+                .order_by(POLICIES_FTS.c.rank, PolicyORM.id))  # rank = bm25 weighted towards name
+    elif dialect_name == "postgresql":
+        tsquery = func.to_tsquery(TS_CONFIG, " & ".join(f"{t}:*" for t in terms))
+        stmt = (select(*POLICY_COLUMNS).where(SEARCH_VECTOR.op("@@")(tsquery))
+                .order_by(func.ts_rank(SEARCH_VECTOR, tsquery).desc(), PolicyORM.id))
+    else:
+        stmt = select(*POLICY_COLUMNS).where(and_(*(
+            or_(PolicyORM.name.icontains(t, autoescape=True), PolicyORM.details.icontains(t, autoescape=True))
+            for t in terms))).order_by(PolicyORM.id)
+    if visible_to is not None:
+        stmt = stmt.where(PolicyORM.owner==visible_to)
+    if owner is not None:
+        stmt = stmt.where(PolicyORM.owner==owner)
+    return stmt
+
+def policy_totals_query(visible_to: Optional[str] = None):
+    """(owners, policies) from the per-owner summary table."""
+    stmt = select(func.count(), func.coalesce(func.sum(PolicyOwnerStatsORM.policies), 0))
+    if visible_to is not None:
+        stmt = stmt.where(PolicyOwnerStatsORM.owner==visible_to)
+    return stmt
+
+def policy_owner_stats_query(visible_to: Optional[str] = None):
+    """Owners with their policy counts, largest first."""
+    stmt = (select(PolicyOwnerStatsORM.owner, PolicyOwnerStatsORM.policies)
+            .order_by(PolicyOwnerStatsORM.policies.desc(), PolicyOwnerStatsORM.owner))
+    if visible_to is not None:
+        stmt = stmt.where(PolicyOwnerStatsORM.owner==visible_to)
+    return stmt
+
+def policy_list_version_query(owner: Optional[str] = None):
+    """Write counter behind the list ETag: one owner's, or the sum over every owner (admin view).
+    Every committed write raises it, whatever order concurrent writers commit in."""
+    if owner is None:
+        return select(func.coalesce(func.sum(PolicyListVersionORM.version), 0))
+    return select(func.coalesce(func.max(PolicyListVersionORM.version), 0)).where(PolicyListVersionORM.owner==owner)
+
+def policy_activity_query(since, visible_to: Optional[str] = None):
+    """Policies created/updated/deleted per UTC day from `since` on, newest day first."""
+    stmt = (select(PolicyActivityORM.day, func.sum(PolicyActivityORM.created), func.sum(PolicyActivityORM.updated),
+                   func.sum(PolicyActivityORM.deleted))
+            .where(PolicyActivityORM.day >= since)
+            .group_by(PolicyActivityORM.day).order_by(PolicyActivityORM.day.desc()))
+    if visible_to is not None:
+        stmt = stmt.where(PolicyActivityORM.owner==visible_to)
+    return stmt
+
+def policy_changes_query(since: int, upto: int, limit: int, visible_to: Optional[str] = None):
+    """Policies changed in (since, upto], one row per policy at its latest change, oldest first,
+    with the policy's current columns (all NULL once it is deleted).
+
+    `visible_to` keeps changes to policies that owner has or had, so a policy moved away from
+    them still shows up (as no longer theirs). Cost follows the number of changes in the range.
+    """
+    latest = (select(PolicyChangeORM.policy_id, func.max(PolicyChangeORM.seq).label("seq"))
+              .where(PolicyChangeORM.seq > since, PolicyChangeORM.seq <= upto, PolicyChangeORM.op != "pruned"))
+    if visible_to is not None:
+        latest = latest.where(or_(PolicyChangeORM.owner==visible_to, PolicyChangeORM.previous_owner==visible_to))
+    latest = latest.group_by(PolicyChangeORM.policy_id).order_by(func.max(PolicyChangeORM.seq)).limit(limit).subquery()
+    return (select(latest.c.seq, latest.c.policy_id, *POLICY_COLUMNS)
+            .select_from(latest.outerjoin(PolicyORM, PolicyORM.id==latest.c.policy_id))
+            .order_by(latest.c.seq))
+
+def policy_changes_head_query(dialect_name: str):
+    """The highest seq a reader may go up to: every change at or below it is committed (or
+    rolled back) for good.
+
+    SQLite writers are serialised, so that is the newest seq. On Postgres seqs start with the
+    writer's transaction id (migration 7), so it is just below the oldest running transaction.
+    """
+    if dialect_name == "postgresql":
+        return select(literal_column("(pg_snapshot_xmin(pg_current_snapshot())::text::bigint << 20) - 1"))
+    return select(func.coalesce(func.max(PolicyChangeORM.seq), 0))
+
+def policy_changes_floor_query():
+    """The oldest change left in the log, with its op ('pruned' once older ones were dropped)."""
+    return select(PolicyChangeORM.seq, PolicyChangeORM.op).order_by(PolicyChangeORM.seq).limit(1)
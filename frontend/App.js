@@ -8,6 +8,7 @@ const API = "http://localhost:8000";
 
 function App() {
   const [token, setToken] = useState("");
+  const [refreshToken, setRefreshToken] = useState("");
   const [role, setRole] = useState("");
   const [username, setUsername] = useState("");
   const [policies, setPolicies] = useState([]);
@@ -16,7 +17,10 @@ function App() {
   const [isLogin, setIsLogin] = useState(true);
 
   useEffect(() => {
-    if (token) fetchPolicies();
+    if (!token) return;
+    let stopped = false;
+    syncPolicies(() => stopped);
+    return () => { stopped = true; };
   }, [token]);
 
   function handleAuth(e) {
@@ -32,39 +36,88 @@ function App() {
       .then((data) => {
         if (data.access_token) {
           setToken(data.access_token);
+          setRefreshToken(data.refresh_token || "");
           setUsername(authForm.username);
           setRole(authForm.role);
         }
       });
   }
 
+  // fetch with the access token; on 401 trade the refresh token for a new pair and retry once
+  function authFetch(url, options = {}) {
+    const withAuth = (t) => ({ ...options, headers: { ...options.headers, Authorization: `Bearer ${t}` } });
+    return fetch(url, withAuth(token)).then((r) => {
+      if (r.status !== 401 || !refreshToken) return r;
+      return fetch(`${API}/token/refresh`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      })
+        .then((rr) => (rr.ok ? rr.json() : Promise.reject(rr)))
+        .then((data) => {
+          setToken(data.access_token);
+          setRefreshToken(data.refresh_token);
+          return fetch(url, withAuth(data.access_token));
+        })
+        .catch(() => {
+          setToken("");  // refresh token expired too: back to the login form
+          return r;
+        });
+    });
+  }
+
+  // position in the change feed first, then the full list, so no write falls between the two
   function fetchPolicies() {
-    fetch(`${API}/policies`, {
-      headers: { Authorization: `Bearer ${token}` },
-    })
+    return authFetch(`${API}/policies/changes`)
       .then((r) => r.json())
-      .then(setPolicies);
+      .then(({ next }) => authFetch(`${API}/policies`)
+        .then((r) => r.json())
+        .then((list) => { setPolicies(list); return next; }));
+  }
+
+  function applyChanges(changes) {
+    setPolicies((current) => {
+      const byId = new Map(current.map((p) => [p.id, p]));
+      for (const c of changes) {
+        if (c.op === "delete") byId.delete(c.id);
+        else byId.set(c.id, c.policy);
+      }
+      return [...byId.values()];
+    });
+  }
+
+  // full load once, then long-poll the change feed; 410 (cursor pruned) means load again
+  async function syncPolicies(stopped) {
+    let since = null;
+    while (!stopped()) {
+      try {
+        if (since === null) since = await fetchPolicies();
+        const r = await authFetch(`${API}/policies/changes?since=${since}&wait=25`);
+        if (r.status === 410) { since = null; continue; }
+        if (!r.ok) throw r;
+        const page = await r.json();
+        if (!stopped()) applyChanges(page.changes);
+        since = page.next;
+      } catch (err) {
+        await new Promise((resolve) => setTimeout(resolve, 5000));  // server unreachable: back off
+      }
+    }
   }
 
   function handleCreate(e) {
     e.preventDefault();
-    fetch(`${API}/policies`, {
+    authFetch(`${API}/policies`, {
       method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-        Authorization: `Bearer ${token}`,
-      },
+      headers: { "Content-Type": "application/json" },
       body: JSON.stringify(form),
     })
       .then((r) => r.json())
-      .then((p) => setPolicies([...policies, p]));
+      .then((p) => applyChanges([{ op: "upsert", id: p.id, policy: p }]));
   }
 
   function handleDelete(id) {
-    fetch(`${API}/policies/${id}`, {
-      method: "DELETE",
-      headers: { Authorization: `Bearer ${token}` },
-    }).then(() => setPolicies(policies.filter((p) => p.id !== id)));
+    authFetch(`${API}/policies/${id}`, { method: "DELETE" })
+      .then(() => applyChanges([{ op: "delete", id }]));
   }
 
   return (
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Summarise request logs (backend/logs/app.log and its rotations) in one streaming pass.
+
+Reads JSON `request.end` records and the older plain-text `END <METHOD> <path> status=N` lines,
+skipping anything else. Files are memory-mapped and split into byte ranges that can be parsed
+in parallel; per-range results are merged, so memory depends on the number of distinct
+paths/users/IPs, not on log size. Usage:
+    python log_stats.py                       # backend/logs (or LOG_DIR)
+    python log_stats.py /var/log/insurance --jobs 4 --json
+"""
+import argparse
+import glob
+import json
+import mmap
+import os
+import re
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "logs"))
+LEGACY_END_RE = re.compile(rb"^\S+ \S+ \w+ \S+ END (\w+) (\S+) status=(\d+)")
+ID_SEGMENT_RE = re.compile(r"/\d+(?=/|$)")
+
+
+def normalize_path(path: str) -> str:
+    """/policies/42 -> /policies/{id}, so per-path stats don't explode with ids."""
+    return ID_SEGMENT_RE.sub("/{id}", path)
+
+
+def quantize_ms(ms: float) -> float:
+    """Round to 3 significant digits: percentiles stay within ~0.5% while the number of distinct
+    values kept per path is bounded."""
+    return float(f"{ms:.3g}")
+
+
+class LogStats:
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.requests = Counter()  # path -> count
+        self.durations = defaultdict(Counter)  # path -> {quantized duration_ms: count}
+        self.status_by_path = defaultdict(Counter)  # path -> {status_code: count}
+        self.status = Counter()
+        self.users = Counter()
+        self.client_ips = Counter()
+        self.legacy_lines = 0
+        self.skipped_lines = 0
+
+    def add(self, method, path, status, duration_ms=None, username=None, client_ip=None):
+        key = f"{method} {normalize_path(path)}"
+        self.requests[key] += 1
+        self.status[status] += 1
+        self.status_by_path[key][status] += 1
+        if duration_ms is not None:
+            self.durations[key][quantize_ms(duration_ms)] += 1
+        if username:
+            self.users[username] += 1
+            if len(self.users) > self.max_keys:
+                self.users = self._prune(self.users)
+        if client_ip:
+            self.client_ips[client_ip] += 1
+            if len(self.client_ips) > self.max_keys:
+                self.client_ips = self._prune(self.client_ips)
+
+    def _prune(self, counter: Counter) -> Counter:
+        # keep the heavy hitters; the long tail only matters for exact counts, not the top list
+        return Counter(dict(counter.most_common(self.max_keys // 2)))
+
+    def feed_line(self, line: bytes):
+        if b'"request.end"' in line:
+            try:
+                rec = json.loads(line)
+                self.add(rec["method"], rec["path"], int(rec["status_code"]), rec.get("duration_ms"),
+                         rec.get("username"), rec.get("client_ip"))
+            except (ValueError, KeyError, TypeError):
+                self.skipped_lines += 1
+            return
+        if b" END " in line:
+            m = LEGACY_END_RE.match(line)
+            if m:
+                self.legacy_lines += 1
+                self.add(m.group(1).decode(), m.group(2).decode("utf-8", "replace"), int(m.group(3)))
+                return
+        if line.strip() and b'"request.start"' not in line and b" START " not in line:
+            self.skipped_lines += 1
+
+    def merge(self, other: "LogStats") -> "LogStats":
+        self.requests.update(other.requests)
+        self.status.update(other.status)
+        for key, counts in other.durations.items():
+            self.durations[key].update(counts)
+        for key, counts in other.status_by_path.items():
+            self.status_by_path[key].update(counts)
+        self.users.update(other.users)
+        self.client_ips.update(other.client_ips)
+        if len(self.users) > self.max_keys:
+            self.users = self._prune(self.users)
+        if len(self.client_ips) > self.max_keys:
+            self.client_ips = self._prune(self.client_ips)
+        self.legacy_lines += other.legacy_lines
+        self.skipped_lines += other.skipped_lines
+        return self
+
+    def report(self, top: int = 10) -> dict:
+        total = sum(self.requests.values())
+        paths = {}
+        for key, count in self.requests.most_common():
+            statuses = self.status_by_path[key]
+            entry = {
+                "requests": count,
+                "error_rate_4xx": round(sum(c for s, c in statuses.items() if 400 <= s < 500) / count, 4),
+                "error_rate_5xx": round(sum(c for s, c in statuses.items() if s >= 500) / count, 4),
+            }
+            entry.update(percentiles(self.durations.get(key, Counter()), (50, 95, 99)))
+            paths[key] = entry
+        return {
+            "total_requests": total,
+            "status_codes": {str(s): c for s, c in sorted(self.status.items())},
+            "error_rate": round(sum(c for s, c in self.status.items() if s >= 400) / total, 4) if total else 0.0,
+            "paths": paths,
+            "top_users": self.users.most_common(top),
+            "top_client_ips": self.client_ips.most_common(top),
+            "legacy_lines": self.legacy_lines,
+            "skipped_lines": self.skipped_lines,
+        }
+
+
+def percentiles(hist: Counter, ps) -> dict:
+    """p50/p95/... of duration_ms from a value->count histogram (None when no durations)."""
+    n = sum(hist.values())
+    out = {f"p{p}_ms": None for p in ps}
+    if not n:
+        return out
+    ordered = sorted(hist.items())
+    for p in ps:
+        rank = max(1, -(-p * n // 100))  # nearest-rank
+        seen = 0
+        for value, count in ordered:
+            seen += count
+            if seen >= rank:
+                out[f"p{p}_ms"] = value
+                break
+    return out
+
+
+def discover(paths) -> list:
+    """Expand directories to their app*.log files and numbered rotations (app.log.1 ...)."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += sorted(f for f in glob.glob(os.path.join(p, "app*.log*")) if re.search(r"\.log(\.\d+)?$", f))
+        elif os.path.exists(p):
+            files.append(p)
+    return files
+
+
+def split_ranges(files, chunk_bytes: int):
+    """(path, start, end) byte ranges of at most `chunk_bytes`, the unit of parallel work."""
+    ranges = []
+    for f in files:
+        size = os.path.getsize(f)
+        for start in range(0, size, chunk_bytes):
+            ranges.append((f, start, min(start + chunk_bytes, size)))
+    return ranges
+
+
+def scan_range(path: str, start: int, end: int, max_keys: int = 100_000) -> LogStats:
+    """Parse the lines that *begin* inside [start, end); a line straddling `end` belongs here."""
+    stats = LogStats(max_keys)
+    with open(path, "rb") as fh:
+        if end <= start:
+            return stats
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            if start > 0 and mm[start - 1:start] != b"\n":
+                nl = mm.find(b"\n", start)
+                pos = len(mm) if nl == -1 else nl + 1
+            mm.seek(pos)
+            while mm.tell() < end:
+                line = mm.readline()
+                if not line:
+                    break
+                stats.feed_line(line)
+    return stats
+
+
+def analyze(paths, jobs: int = 1, chunk_mb: int = 64, max_keys: int = 100_000) -> LogStats:
+    ranges = split_ranges(discover(paths), chunk_mb * 1024 * 1024)
+    total = LogStats(max_keys)
+    if jobs > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            for part in pool.map(scan_range, *zip(*ranges), [max_keys] * len(ranges)):
+                total.merge(part)
+    else:
+        for r in ranges:
+            total.merge(scan_range(*r, max_keys))
+    return total
+
+
+def print_report(report: dict):
+    print(f"Requests: {report['total_requests']}  error rate: {report['error_rate']:.2%}  "
+          f"(legacy lines: {report['legacy_lines']}, skipped: {report['skipped_lines']})")
+    print("Status codes: " + ", ".join(f"{s}={c}" for s, c in report["status_codes"].items()))
+    print(f"{'path':<40} {'count':>8} {'4xx':>7} {'5xx':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    fmt = lambda v: "-" if v is None else f"{v:g}"  # noqa: E731
+    for path, e in report["paths"].items():
+        print(f"{path:<40} {e['requests']:>8} {e['error_rate_4xx']:>7.2%} {e['error_rate_5xx']:>7.2%} "
+              f"{fmt(e['p50_ms']):>8} {fmt(e['p95_ms']):>8} {fmt(e['p99_ms']):>8}")
+    print("Top users: " + ", ".join(f"{u} ({c})" for u, c in report["top_users"]))
+    print("Top client IPs: " + ", ".join(f"{ip} ({c})" for ip, c in report["top_client_ips"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate request logs")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_LOG_DIR], help="log files or directories")
+    parser.add_argument("--jobs", type=int, default=1, help="parallel worker processes")
+    parser.add_argument("--chunk-mb", type=int, default=64, help="byte range size per parallel task")
+    parser.add_argument("--top", type=int, default=10, help="entries in the top users/IPs lists")
+    parser.add_argument("--max-keys", type=int, default=100_000, help="distinct users/IPs tracked before pruning the tail")
+    parser.add_argument("--json", action="store_true", help="emit the report as JSON")
+    args = parser.parse_args()
+    result = analyze(args.paths, jobs=args.jobs, chunk_mb=args.chunk_mb, max_keys=args.max_keys).report(args.top)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)